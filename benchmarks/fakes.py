@@ -0,0 +1,658 @@
+"""
+Local stand-ins for the external services used by the pipeline.
+
+- InMemoryFirestore: the subset of the Firestore client API used by
+  FirebaseService, BatchWriter and the caches, kept in memory.
+- FakeYouTube: an HTTP transport for googleapiclient that answers
+  channels.list, playlistItems.list and videos.list from the recorded
+  responses in fixtures/ for a synthetic catalog of channels and videos,
+  plus the channels' RSS feeds.
+- FakeTranscripts: replaces YouTubeTranscriptApi.list_transcripts.
+- StubAnthropicServer: a local HTTP server implementing POST /v1/messages
+  and the Message Batches endpoints.
+
+Every fake sleeps for a configurable latency per call and counts its calls.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return json.load(f)
+
+class CallCounter:
+    """Thread-safe call counts shared by the fakes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def add(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def as_dict(self):
+        with self._lock:
+            return dict(self._counts)
+
+# Firestore
+
+def _normalize(value):
+    """Store values the way Firestore returns them: naive datetimes become UTC-aware"""
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    return value
+
+def _matches(data, field_filter):
+    if field_filter.field_path not in data:
+        return False
+    value = data[field_filter.field_path]
+    op = field_filter.op_string
+    expected = _normalize(field_filter.value)
+    try:
+        if op == '==':
+            return value == expected
+        if op == '!=':
+            return value != expected
+        if op == '<':
+            return value < expected
+        if op == '<=':
+            return value <= expected
+        if op == '>':
+            return value > expected
+        if op == '>=':
+            return value >= expected
+        if op == 'in':
+            return value in expected
+        if op == 'not-in':
+            return value not in expected
+        if op == 'array_contains':
+            return expected in value
+    except TypeError:
+        return False
+    raise NotImplementedError(f"Operator {op} not supported by InMemoryFirestore")
+
+class FakeSnapshot:
+    def __init__(self, reference, data, field_paths=None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        if data is not None and field_paths is not None:
+            data = {key: value for key, value in data.items() if key in field_paths}
+        self._data = copy.deepcopy(data)
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+    def get(self, field_path):
+        return self._data[field_path]
+
+class FakeDocumentReference:
+    def __init__(self, db, collection_path, doc_id):
+        self._db = db
+        self._collection_path = collection_path
+        self.id = doc_id
+        self.path = f"{collection_path}/{doc_id}"
+
+    def collection(self, name):
+        return FakeCollection(self._db, f"{self.path}/{name}")
+
+    def get(self, field_paths=None):
+        self._db.rpc('document.get')
+        return FakeSnapshot(self, self._db.read(self._collection_path, self.id), field_paths)
+
+    def set(self, data, merge=False):
+        self._db.rpc('document.set')
+        self._db.write(self._collection_path, self.id, data, merge=merge)
+
+    def update(self, data):
+        self._db.rpc('document.update')
+        self._db.write(self._collection_path, self.id, data, merge=True, must_exist=True)
+
+    def delete(self):
+        self._db.rpc('document.delete')
+        self._db.remove(self._collection_path, self.id)
+
+class FakeQuery:
+    def __init__(self, db, collection_path, filters=(), orders=(), limit_count=None, fields=None, cursor=None):
+        self._db = db
+        self._collection_path = collection_path
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit_count
+        self._fields = fields
+        self._cursor = cursor
+
+    def _copy(self, **changes):
+        state = {
+            'filters': self._filters,
+            'orders': self._orders,
+            'limit_count': self._limit,
+            'fields': self._fields,
+            'cursor': self._cursor,
+            **changes
+        }
+        return FakeQuery(self._db, self._collection_path, **state)
+
+    def where(self, filter):
+        return self._copy(filters=self._filters + (filter,))
+
+    def order_by(self, field_path, direction='ASCENDING'):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit_count=count)
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    def start_after(self, snapshot):
+        return self._copy(cursor=snapshot.id)
+
+    def stream(self):
+        self._db.rpc('query.stream')
+        documents = self._db.list(self._collection_path)
+        results = [
+            (doc_id, data) for doc_id, data in documents
+            if all(_matches(data, field_filter) for field_filter in self._filters)
+            # Documents without an order_by field are not returned by Firestore
+            and all(field in data for field, _ in self._orders)
+        ]
+        results.sort(key=lambda item: item[0])
+        for field, direction in reversed(self._orders):
+            results.sort(key=lambda item: item[1][field], reverse=direction == 'DESCENDING')
+        if self._cursor is not None:
+            # Cursors resume after the position of the given document
+            ids = [doc_id for doc_id, _ in results]
+            results = results[ids.index(self._cursor) + 1:] if self._cursor in ids else []
+        if self._limit is not None:
+            results = results[:self._limit]
+
+        for doc_id, data in results:
+            reference = FakeDocumentReference(self._db, self._collection_path, doc_id)
+            yield FakeSnapshot(reference, data, self._fields)
+
+    def get(self):
+        return list(self.stream())
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, collection_path):
+        super().__init__(db, collection_path)
+        self.id = collection_path.split('/')[-1]
+
+    def document(self, document_id=None):
+        return FakeDocumentReference(self._db, self._collection_path, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, data):
+        reference = self.document()
+        reference.set(data)
+        return datetime.now(timezone.utc), reference
+
+class FakeWriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._operations = []
+
+    def set(self, reference, data, merge=False):
+        self._operations.append(('set', reference, data, merge))
+
+    def update(self, reference, data):
+        self._operations.append(('update', reference, data, True))
+
+    def delete(self, reference):
+        self._operations.append(('delete', reference, None, False))
+
+    def commit(self):
+        self._db.rpc('batch.commit')
+        with self._db.lock:
+            for kind, reference, data, merge in self._operations:
+                if kind == 'delete':
+                    self._db.remove(reference._collection_path, reference.id)
+                else:
+                    self._db.write(reference._collection_path, reference.id, data,
+                                   merge=merge, must_exist=kind == 'update')
+
+class InMemoryFirestore:
+    """In-memory replacement for google.cloud.firestore.Client"""
+
+    def __init__(self, latency_seconds=0.0):
+        self.latency_seconds = latency_seconds
+        self.lock = threading.RLock()
+        self.calls = CallCounter()
+        self._collections = {}
+
+    def rpc(self, name):
+        self.calls.add(name)
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def get_all(self, references, field_paths=None):
+        self.rpc('get_all')
+        for reference in references:
+            yield FakeSnapshot(reference, self.read(reference._collection_path, reference.id), field_paths)
+
+    def read(self, collection_path, doc_id):
+        with self.lock:
+            return copy.deepcopy(self._collections.get(collection_path, {}).get(doc_id))
+
+    def list(self, collection_path):
+        with self.lock:
+            return copy.deepcopy(list(self._collections.get(collection_path, {}).items()))
+
+    def write(self, collection_path, doc_id, data, merge=False, must_exist=False):
+        from google.cloud.firestore_v1 import DELETE_FIELD
+        deleted = [key for key, value in data.items() if value is DELETE_FIELD]
+        data = _normalize(copy.deepcopy({key: value for key, value in data.items() if key not in deleted}))
+        with self.lock:
+            documents = self._collections.setdefault(collection_path, {})
+            if must_exist and doc_id not in documents:
+                raise KeyError(f"No document to update: {collection_path}/{doc_id}")
+            if merge and doc_id in documents:
+                documents[doc_id].update(data)
+                for key in deleted:
+                    documents[doc_id].pop(key, None)
+            else:
+                documents[doc_id] = data
+
+    def remove(self, collection_path, doc_id):
+        with self.lock:
+            self._collections.get(collection_path, {}).pop(doc_id, None)
+
+    def count(self, collection_path):
+        with self.lock:
+            return len(self._collections.get(collection_path, {}))
+
+# YouTube Data API
+
+RSS_URL = 'https://www.youtube.com/feeds/videos.xml'
+RSS_MAX_ENTRIES = 15
+
+class FakeYouTube:
+    """
+    Synthetic catalog of channels x videos_per_channel videos served from the
+    recorded API responses. Every channel also has one video older than the
+    7-day window, so discovery stops the way it does on real channels.
+    """
+
+    PAGE_SIZE = 50
+
+    def __init__(self, channels, videos_per_channel, latency_seconds=0.0):
+        self.latency_seconds = latency_seconds
+        self.calls = CallCounter()
+        self._channel_fixture = load_fixture('channels_list.json')
+        self._playlist_fixture = load_fixture('playlist_items_list.json')
+        self._videos_fixture = load_fixture('videos_list.json')
+
+        now = datetime.now(timezone.utc)
+        self.channel_ids = [f"UCbench{index:017d}" for index in range(channels)]
+        self._uploads = {}
+        self._videos = {}
+        for channel_index, channel_id in enumerate(self.channel_ids):
+            uploads = []
+            for video_index in range(videos_per_channel + 1):
+                video_id = f"v{channel_index:04d}{video_index:06d}"
+                if video_index < videos_per_channel:
+                    # Spread the recent uploads over the last 6 days, newest first
+                    published_at = now - timedelta(hours=1 + 143 * video_index / max(1, videos_per_channel))
+                else:
+                    published_at = now - timedelta(days=30)
+                self._videos[video_id] = (channel_id, channel_index, video_index, published_at)
+                uploads.append(video_id)
+            self._uploads['UU' + channel_id[2:]] = uploads
+
+    def http(self):
+        """A new HTTP transport for one googleapiclient client"""
+        return FakeYouTubeHttp(self)
+
+    def install_rss(self):
+        """Serve the channels' RSS feeds from requests.get; other URLs are fetched normally"""
+        import requests
+        real_get = requests.get
+
+        def get(url, params=None, **kwargs):
+            if url != RSS_URL:
+                return real_get(url, params=params, **kwargs)
+            response = requests.models.Response()
+            response.status_code = 200
+            response._content = self._rss_feed(params['channel_id'])
+            return response
+
+        requests.get = get
+
+    def _rss_feed(self, channel_id):
+        self.calls.add('youtube.rss')
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+        entries = []
+        for video_id in self._uploads.get('UU' + channel_id[2:], [])[:RSS_MAX_ENTRIES]:
+            published_at = self._videos[video_id][3].strftime('%Y-%m-%dT%H:%M:%S+00:00')
+            entries.append(f"<entry><yt:videoId>{video_id}</yt:videoId><published>{published_at}</published></entry>")
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns="http://www.w3.org/2005/Atom">'
+            f"{''.join(entries)}</feed>"
+        ).encode('utf-8')
+
+    def handle(self, uri):
+        url = urlparse(uri)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        resource = url.path.rstrip('/').split('/')[-1]
+        self.calls.add(f"youtube.{resource}.list")
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+        if resource == 'channels':
+            return self._channels_response(params['id'].split(','))
+        if resource == 'playlistItems':
+            return self._playlist_items_response(params['playlistId'], int(params.get('pageToken') or 0),
+                                                 int(params.get('maxResults') or 5))
+        if resource == 'videos':
+            return self._videos_response(params['id'].split(','))
+        raise NotImplementedError(f"FakeYouTube does not serve {url.path}")
+
+    def _channels_response(self, channel_ids):
+        response = copy.deepcopy(self._channel_fixture)
+        template = response['items'][0]
+        response['items'] = []
+        for channel_id in channel_ids:
+            if channel_id not in self.channel_ids:
+                continue
+            item = copy.deepcopy(template)
+            item['id'] = channel_id
+            item['snippet']['title'] = f"Canal {self.channel_ids.index(channel_id)}"
+            item['contentDetails']['relatedPlaylists']['uploads'] = 'UU' + channel_id[2:]
+            item['statistics']['videoCount'] = str(len(self._uploads['UU' + channel_id[2:]]))
+            response['items'].append(item)
+        response['pageInfo']['totalResults'] = len(response['items'])
+        return response
+
+    def _playlist_items_response(self, playlist_id, offset, max_results):
+        uploads = self._uploads.get(playlist_id, [])
+        page = uploads[offset:offset + min(max_results, self.PAGE_SIZE)]
+
+        response = copy.deepcopy(self._playlist_fixture)
+        template = response['items'][0]
+        response['items'] = []
+        for video_id in page:
+            item = copy.deepcopy(template)
+            item['id'] = f"{playlist_id}.{video_id}"
+            item['contentDetails']['videoId'] = video_id
+            item['contentDetails']['videoPublishedAt'] = self._videos[video_id][3].strftime('%Y-%m-%dT%H:%M:%SZ')
+            response['items'].append(item)
+        response['pageInfo']['totalResults'] = len(uploads)
+        if offset + len(page) < len(uploads):
+            response['nextPageToken'] = str(offset + len(page))
+        else:
+            response.pop('nextPageToken', None)
+        return response
+
+    def _videos_response(self, video_ids):
+        response = copy.deepcopy(self._videos_fixture)
+        template = response['items'][0]
+        response['items'] = []
+        for video_id in video_ids:
+            if video_id not in self._videos:
+                continue
+            channel_id, channel_index, video_index, published_at = self._videos[video_id]
+            item = copy.deepcopy(template)
+            item['id'] = video_id
+            item['snippet']['channelId'] = channel_id
+            item['snippet']['channelTitle'] = f"Canal {channel_index}"
+            item['snippet']['title'] = f"{template['snippet']['title']} #{video_index}"
+            item['snippet']['publishedAt'] = published_at.strftime('%Y-%m-%dT%H:%M:%SZ')
+            response['items'].append(item)
+        response['pageInfo']['totalResults'] = len(response['items'])
+        response['pageInfo']['resultsPerPage'] = len(response['items'])
+        return response
+
+class FakeYouTubeHttp:
+    """
+    httplib2.Http replacement passed to googleapiclient. Responses carry an
+    ETag and requests whose If-None-Match matches it get a 304 without body.
+    """
+
+    def __init__(self, youtube):
+        self.youtube = youtube
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=None, connection_type=None):
+        import httplib2
+        content = json.dumps(self.youtube.handle(uri)).encode('utf-8')
+        etag = '"' + hashlib.sha1(content).hexdigest() + '"'
+        if (headers or {}).get('if-none-match') == etag:
+            self.youtube.calls.add('youtube.not_modified')
+            return httplib2.Response({'status': '304', 'etag': etag}), b''
+        return httplib2.Response({'status': '200', 'content-type': 'application/json; charset=UTF-8', 'etag': etag}), content
+
+# Transcripts
+
+class FakeTranscripts:
+    """
+    Replacement for YouTubeTranscriptApi.list_transcripts returning the
+    recorded transcript, repeated segment_repeats times, for every video.
+    """
+
+    def __init__(self, latency_seconds=0.0, segment_repeats=1):
+        self.latency_seconds = latency_seconds
+        self.calls = CallCounter()
+        fixture = load_fixture('transcript.json')
+        span = fixture[-1]['start'] + fixture[-1]['duration']
+        self.segments = [
+            {**segment, 'start': segment['start'] + repeat * span}
+            for repeat in range(segment_repeats)
+            for segment in fixture
+        ]
+
+    def install(self):
+        from youtube_transcript_api import YouTubeTranscriptApi
+        YouTubeTranscriptApi.list_transcripts = staticmethod(self.list_transcripts)
+
+    def list_transcripts(self, video_id, proxies=None, cookies=None):
+        self.calls.add('transcripts.list')
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return _FakeTranscriptList(self)
+
+class _FakeTranscriptList:
+    def __init__(self, transcripts):
+        self._transcripts = transcripts
+
+    def find_transcript(self, language_codes):
+        return _FakeTranscript(self._transcripts, language_codes[0])
+
+class _FakeTranscript:
+    def __init__(self, transcripts, language_code):
+        self._transcripts = transcripts
+        self.language_code = language_code
+
+    def fetch(self):
+        self._transcripts.calls.add('transcripts.fetch')
+        return copy.deepcopy(self._transcripts.segments)
+
+# Anthropic
+
+class StubAnthropicServer:
+    """
+    Local server for POST /v1/messages. Answers every request after
+    latency_seconds with a fixed summary and a usage estimated from the
+    request size, like the real API's 4 characters per token.
+
+    Message Batches (POST /v1/messages/batches) are answered the same way:
+    a batch is in progress when created and has ended, with one result per
+    request, from the first time it is retrieved.
+    """
+
+    def __init__(self, latency_seconds=0.0, output_tokens=400):
+        self.latency_seconds = latency_seconds
+        self.output_tokens = output_tokens
+        self.calls = CallCounter()
+        self._batches = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _message(self, params):
+        """The response to one messages.create request"""
+        summary = ("Resumo de referência gerado pelo servidor de benchmark. " * self.output_tokens)[:self.output_tokens * 4]
+        return {
+            'id': f"msg_bench_{uuid.uuid4().hex[:24]}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': params.get('model', 'claude-bench'),
+            'content': [{'type': 'text', 'text': summary}],
+            'stop_reason': 'end_turn',
+            'stop_sequence': None,
+            'usage': {
+                'input_tokens': max(1, len(json.dumps(params)) // 4),
+                'output_tokens': self.output_tokens,
+                'cache_creation_input_tokens': 0,
+                'cache_read_input_tokens': 0
+            }
+        }
+
+    def _create_batch(self, requests):
+        batch_id = f"msgbatch_bench_{uuid.uuid4().hex[:24]}"
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            self._batches[batch_id] = {
+                'batch': {
+                    'id': batch_id,
+                    'type': 'message_batch',
+                    'processing_status': 'in_progress',
+                    'request_counts': {'processing': len(requests), 'succeeded': 0, 'errored': 0, 'canceled': 0, 'expired': 0},
+                    'created_at': now.isoformat(),
+                    'expires_at': (now + timedelta(days=1)).isoformat(),
+                    'ended_at': None,
+                    'cancel_initiated_at': None,
+                    'archived_at': None,
+                    'results_url': None
+                },
+                'requests': requests,
+                'results': None
+            }
+            return copy.deepcopy(self._batches[batch_id]['batch'])
+
+    def _retrieve_batch(self, batch_id):
+        """Get a batch, ending it with its results the first time it is retrieved"""
+        with self._lock:
+            entry = self._batches.get(batch_id)
+            if entry is None:
+                return None
+            if entry['results'] is None:
+                entry['results'] = [
+                    {'custom_id': request['custom_id'], 'result': {'type': 'succeeded', 'message': self._message(request['params'])}}
+                    for request in entry['requests']
+                ]
+                entry['batch'].update(
+                    processing_status='ended',
+                    request_counts={'processing': 0, 'succeeded': len(entry['results']), 'errored': 0, 'canceled': 0, 'expired': 0},
+                    ended_at=datetime.now(timezone.utc).isoformat(),
+                    results_url=f"{self.base_url}/v1/messages/batches/{batch_id}/results"
+                )
+            return copy.deepcopy(entry['batch'])
+
+    def _batch_results(self, batch_id):
+        with self._lock:
+            entry = self._batches.get(batch_id)
+            return entry and entry['results']
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                path = urlparse(self.path).path
+                if path == '/v1/messages':
+                    stub.calls.add('anthropic.messages.create')
+                    if stub.latency_seconds:
+                        time.sleep(stub.latency_seconds)
+                    self._send(200, stub._message(json.loads(body)))
+                elif path == '/v1/messages/batches':
+                    stub.calls.add('anthropic.messages.batches.create')
+                    self._send(200, stub._create_batch(json.loads(body)['requests']))
+                else:
+                    self._not_found()
+
+            def do_GET(self):
+                parts = urlparse(self.path).path.strip('/').split('/')
+                if parts[:3] != ['v1', 'messages', 'batches'] or len(parts) not in (4, 5):
+                    self._not_found()
+                    return
+                    
+                if len(parts) == 4:
+                    stub.calls.add('anthropic.messages.batches.retrieve')
+                    batch = stub._retrieve_batch(parts[3])
+                    if batch is None:
+                        self._not_found()
+                    else:
+                        self._send(200, batch)
+                    return
+                    
+                results = stub._batch_results(parts[3]) if parts[4] == 'results' else None
+                if results is None:
+                    self._not_found()
+                    return
+                stub.calls.add('anthropic.messages.batches.results')
+                if stub.latency_seconds:
+                    time.sleep(stub.latency_seconds)
+                content = ''.join(json.dumps(result) + '\n' for result in results).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/binary')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def _not_found(self):
+                self._send(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': self.path}})
+
+            def _send(self, status, payload):
+                content = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,69 @@
+"""
+Import-time benchmark for the Cloud Functions entry points.
+
+Imports each module in a fresh interpreter with `python -X importtime`, which
+is what a cold start pays before the first request is handled, and reports the
+median total time and the slowest imports. No credentials are needed: importing
+an entry point must not build any service.
+
+Usage (from the repository root):
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --module main --module scraper --runs 10
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+FUNCTIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'functions')
+
+# import time: self [us] | cumulative | imported package
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+def measure_import(module):
+    """Import module in a new interpreter; returns {imported module: cumulative microseconds}"""
+    check = (
+        f"import {module}, services; "
+        "assert not services._instances, 'services built at import time: %s' % sorted(services._instances)"
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', check],
+        cwd=FUNCTIONS_DIR,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import of {module} failed:\n{result.stderr[-2000:]}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            timings[match.group(4)] = int(match.group(2))
+    return timings
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Measure cold import time of the entry points')
+    arg_parser.add_argument('--module', action='append', help='module to import (default: main)')
+    arg_parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per module')
+    arg_parser.add_argument('--top', type=int, default=10, help='slowest imports to list')
+    args = arg_parser.parse_args()
+
+    for module in args.module or ['main']:
+        runs = [measure_import(module) for _ in range(args.runs)]
+        totals = [run[module] / 1000 for run in runs]
+        print(f"\n{module}: median {statistics.median(totals):.1f} ms "
+              f"(min {min(totals):.1f} ms, max {max(totals):.1f} ms, {args.runs} runs)")
+
+        # Slowest top-level imports of the last run
+        slowest = sorted(runs[-1].items(), key=lambda item: item[1], reverse=True)
+        print(f"{'MÓDULO':<50} | {'ACUMULADO (ms)':>15}")
+        for name, cumulative in [item for item in slowest if item[0] != module][:args.top]:
+            print(f"{name:<50} | {cumulative / 1000:>15.1f}")
+
+if __name__ == '__main__':
+    main()
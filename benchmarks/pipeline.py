@@ -0,0 +1,205 @@
+"""
+Offline end-to-end benchmark of run_full_process.
+
+Runs the real pipeline code (scraper, services, BatchWriter, caches and the
+googleapiclient/Anthropic clients) against the local fakes in fakes.py for
+N channels x M videos, then reports throughput, p50/p95 latency per stage
+and the number of calls made to each backend.
+
+Usage (from the repository root):
+
+    python benchmarks/pipeline.py --channels 20 --videos 10
+    python benchmarks/pipeline.py --anthropic-latency-ms 800 --output bench.json
+    python benchmarks/pipeline.py --baseline bench.json   # exit 1 on regression
+
+With --baseline the run fails when throughput drops by more than
+--max-regression or when any backend is called more often than in the
+baseline, so it can be used as a CI check.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+FUNCTIONS_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), 'functions')
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description='Offline benchmark of the full processing flow')
+    arg_parser.add_argument('--channels', type=int, default=10, help='active channels')
+    arg_parser.add_argument('--videos', type=int, default=10, help='recent videos per channel')
+    arg_parser.add_argument('--transcript-repeats', type=int, default=20,
+                            help='times the recorded transcript is repeated per video (controls its length)')
+    arg_parser.add_argument('--youtube-latency-ms', type=float, default=30)
+    arg_parser.add_argument('--transcript-latency-ms', type=float, default=150)
+    arg_parser.add_argument('--firestore-latency-ms', type=float, default=10)
+    arg_parser.add_argument('--anthropic-latency-ms', type=float, default=300)
+    arg_parser.add_argument('--output', help='write the results as JSON to this file')
+    arg_parser.add_argument('--baseline', help='results JSON of a previous run to compare with')
+    arg_parser.add_argument('--max-regression', type=float, default=0.2,
+                            help='allowed throughput drop relative to the baseline (0.2 = 20%%)')
+    return arg_parser.parse_args()
+
+def configure_environment(anthropic_base_url, work_dir):
+    """Settings read by config.py; must run before any pipeline module is imported"""
+    os.environ['ANTHROPIC_BASE_URL'] = anthropic_base_url
+    os.environ['ANTHROPIC_API_KEY'] = 'benchmark'
+    os.environ['YOUTUBE_API_KEY'] = 'benchmark'
+    os.environ['TRANSCRIPT_CACHE_PATH'] = os.path.join(work_dir, 'transcript_cache.sqlite3')
+    os.environ['YOUTUBE_HTTP_CACHE_PATH'] = os.path.join(work_dir, 'youtube_http_cache.sqlite3')
+    os.environ['METRICS_OPENMETRICS_PATH'] = ''
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    sys.path.insert(0, FUNCTIONS_DIR)
+
+def seed(db, channel_ids):
+    """Active channels and the prompt templates the pipeline expects"""
+    from datetime import datetime, timezone
+    for channel_id in channel_ids:
+        db.collection('channels').document(channel_id).set({
+            'channel_id': channel_id,
+            'title': channel_id,
+            'url': f"https://www.youtube.com/channel/{channel_id}",
+            'status': 'ACTIVE',
+            'platform': 'Youtube',
+            'created_at': datetime.now(timezone.utc)
+        })
+    db.collection('prompts').document('benchmark').set({
+        'created_at': datetime.now(timezone.utc),
+        'video_summary_prompt': 'Resuma os principais pontos do vídeo %VIDEO_TITLE em tópicos curtos.',
+        'channel_weekly_summary_prompt': 'Resuma a semana do canal %CHANNEL_NAME a partir dos resumos dos vídeos.',
+        'master_group_summary_prompt': 'Combine os resumos semanais destes canais em um único resumo.',
+        'master_weekly_summary_prompt': 'Escreva o resumo semanal consolidado de todos os canais.'
+    })
+
+def run(args):
+    from fakes import FakeTranscripts, FakeYouTube, InMemoryFirestore, StubAnthropicServer
+
+    anthropic = StubAnthropicServer(latency_seconds=args.anthropic_latency_ms / 1000).start()
+    work_dir = tempfile.mkdtemp(prefix='pipeline-benchmark-')
+    configure_environment(anthropic.base_url, work_dir)
+
+    import services
+    from claude_service import ClaudeService
+    from firebase_service import FirebaseService
+    from metrics import metrics
+    from youtube_service import YouTubeService
+
+    class BenchmarkFirebaseService(FirebaseService):
+        """FirebaseService on top of the in-memory Firestore"""
+
+        def __init__(self, db):
+            self.db = db
+
+    db = InMemoryFirestore(latency_seconds=args.firestore_latency_ms / 1000)
+    youtube = FakeYouTube(args.channels, args.videos, latency_seconds=args.youtube_latency_ms / 1000)
+    youtube.install_rss()
+    transcripts = FakeTranscripts(latency_seconds=args.transcript_latency_ms / 1000,
+                                  segment_repeats=args.transcript_repeats)
+    transcripts.install()
+    seed(db, youtube.channel_ids)
+
+    firebase_service = BenchmarkFirebaseService(db)
+    claude_service = ClaudeService(firebase_service)
+    services.register_service('firebase', firebase_service)
+    services.register_service('claude', claude_service)
+    services.register_service('youtube', YouTubeService(firebase_service, claude_service, http_factory=youtube.http))
+
+    import scraper
+    # run_full_process parses the command line for CLI actions
+    sys.argv = [sys.argv[0]]
+    start = time.perf_counter()
+    try:
+        scraper.run_full_process()
+    finally:
+        anthropic.stop()
+    elapsed = time.perf_counter() - start
+
+    report = metrics.report()
+    videos = db.count('videos')
+    return {
+        'parameters': vars(args),
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput': {
+            'channels_per_second': round(args.channels / elapsed, 3),
+            'videos_per_second': round(videos / elapsed, 3)
+        },
+        'documents': {
+            'videos': videos,
+            'insights': db.count('insights')
+        },
+        'stages': {
+            stage: {key: stats[key] for key in ('count', 'p50_seconds', 'p95_seconds', 'total_seconds')}
+            for stage, stats in sorted(report['stages'].items())
+        },
+        'counters': report['counters'],
+        'calls': {
+            **youtube.calls.as_dict(),
+            **transcripts.calls.as_dict(),
+            **anthropic.calls.as_dict(),
+            **{f"firestore.{name}": count for name, count in db.calls.as_dict().items()}
+        }
+    }
+
+def print_results(results):
+    print(f"\n{results['parameters']['channels']} canais x {results['parameters']['videos']} vídeos "
+          f"em {results['elapsed_seconds']}s")
+    print(f"Vazão: {results['throughput']['videos_per_second']} vídeos/s, "
+          f"{results['throughput']['channels_per_second']} canais/s")
+    print(f"Documentos: {results['documents']['videos']} vídeos, {results['documents']['insights']} insights")
+
+    print("-" * 90)
+    print(f"{'ETAPA':<45} | {'CHAMADAS':>8} | {'P50 (ms)':>12} | {'P95 (ms)':>12}")
+    print("-" * 90)
+    for stage, stats in results['stages'].items():
+        print(f"{stage:<45} | {stats['count']:>8} | {stats['p50_seconds'] * 1000:>12.1f} | {stats['p95_seconds'] * 1000:>12.1f}")
+    print("-" * 90)
+
+    print(f"{'CHAMADAS AOS SERVIÇOS':<45} | {'TOTAL':>8}")
+    for name, count in sorted(results['calls'].items()):
+        print(f"{name:<45} | {count:>8}")
+    print("-" * 90)
+    for name, value in sorted(results['counters'].items()):
+        print(f"{name:<45} | {value:>8}")
+
+def compare_with_baseline(results, baseline, max_regression):
+    """Return the regressions found relative to a previous run"""
+    regressions = []
+    for key in ('channels', 'videos', 'transcript_repeats'):
+        if baseline['parameters'].get(key) != results['parameters'].get(key):
+            regressions.append(f"parameter {key} differs from the baseline, results are not comparable")
+
+    expected = baseline['throughput']['videos_per_second'] * (1 - max_regression)
+    if results['throughput']['videos_per_second'] < expected:
+        regressions.append(f"throughput {results['throughput']['videos_per_second']} videos/s "
+                           f"is below {expected:.3f} (baseline {baseline['throughput']['videos_per_second']})")
+
+    for name, count in sorted(results['calls'].items()):
+        if count > baseline['calls'].get(name, 0):
+            regressions.append(f"{name}: {count} calls, baseline {baseline['calls'].get(name, 0)}")
+    return regressions
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, BENCHMARKS_DIR)
+    results = run(args)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.max_regression)
+        for regression in regressions:
+            print(f"❌ Regressão: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("✅ Sem regressões em relação ao baseline")
+
+if __name__ == '__main__':
+    main()
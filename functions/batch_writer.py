@@ -0,0 +1,140 @@
+import threading
+import time
+from concurrency import limit
+from metrics import metrics
+from config import FIRESTORE_BATCH_SIZE, FIRESTORE_FLUSH_SECONDS
+from log import get_logger
+
+logger = get_logger('batch_writer')
+
+class BatchWriter:
+    """
+    Buffers Firestore writes and commits them in WriteBatch groups.
+
+    A batch is committed when it holds max_operations writes or when its oldest
+    write is older than max_interval_seconds; call flush() (or use the writer as
+    a context manager) to commit what is left. When a batch commit fails, its
+    writes are retried one by one so failures are reported per document.
+    Writes queued together with set_group() always share a batch and are
+    retried together, so they are saved all or none.
+    """
+
+    def __init__(self, db, max_operations=FIRESTORE_BATCH_SIZE, max_interval_seconds=FIRESTORE_FLUSH_SECONDS):
+        self.db = db
+        self.max_operations = min(max_operations, 500)
+        self.max_interval_seconds = max_interval_seconds
+        self.failures = []
+        # Queued groups of operations and the number of operations in them
+        self._operations = []
+        self._operation_count = 0
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def set(self, doc_ref, data, merge=False):
+        """Queue a set() of the document"""
+        # Copied so later changes to the caller's dict are not written
+        self._add([('set', doc_ref, dict(data), merge)])
+
+    def update(self, doc_ref, data):
+        """Queue an update() of the document"""
+        self._add([('update', doc_ref, dict(data), None)])
+
+    def set_group(self, writes):
+        """Queue set()s of several documents, [(doc_ref, data, merge)], committed atomically"""
+        if len(writes) > self.max_operations:
+            raise ValueError(f"A group of {len(writes)} writes does not fit in one batch")
+        self._add([('set', doc_ref, dict(data), merge) for doc_ref, data, merge in writes])
+
+    def flush(self):
+        """Commit all queued writes and return the failures of this flush"""
+        with self._lock:
+            operations = self._take_operations()
+        return self._commit(operations)
+
+    def _add(self, group):
+        with self._lock:
+            # Committing first keeps every batch within max_operations without splitting groups
+            operations = []
+            if self._operation_count + len(group) > self.max_operations:
+                operations = self._take_operations()
+            self._operations.append(group)
+            self._operation_count += len(group)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+                
+            if (self._operation_count >= self.max_operations
+                    or time.monotonic() - self._oldest >= self.max_interval_seconds):
+                operations.extend(self._take_operations())
+        self._commit(operations)
+
+    def _take_operations(self):
+        operations = self._operations
+        self._operations = []
+        self._operation_count = 0
+        self._oldest = None
+        return operations
+
+    def _commit(self, groups):
+        """Commit groups of writes in batches of at most max_operations"""
+        failures = []
+        batch_groups = []
+        for group in groups:
+            if sum(len(queued) for queued in batch_groups) + len(group) > self.max_operations:
+                failures.extend(self._commit_batch(batch_groups))
+                batch_groups = []
+            batch_groups.append(group)
+        failures.extend(self._commit_batch(batch_groups))
+        return failures
+
+    def _commit_batch(self, groups):
+        if not groups:
+            return []
+            
+        operation_count = sum(len(group) for group in groups)
+        batch = self.db.batch()
+        for group in groups:
+            for operation in group:
+                self._apply(batch, operation)
+            
+        try:
+            with limit('firestore'), metrics.timer('firestore.batch_commit'):
+                batch.commit()
+            metrics.increment('firestore.writes', operation_count)
+            logger.debug("Lote de %d escritas salvo no Firestore", operation_count, extra={'stage': 'firestore.batch_commit'})
+            return []
+        except Exception as e:
+            logger.warning("Erro ao salvar lote de %d escritas, tentando individualmente: %s", operation_count, e,
+                           extra={'stage': 'firestore.batch_commit'})
+            
+        failures = []
+        for group in groups:
+            batch = self.db.batch()
+            for operation in group:
+                self._apply(batch, operation)
+            try:
+                with limit('firestore'), metrics.timer('firestore.batch_commit'):
+                    batch.commit()
+                metrics.increment('firestore.writes', len(group))
+            except Exception as e:
+                for operation in group:
+                    doc_path = operation[1].path
+                    logger.error("Erro ao salvar documento %s: %s", doc_path, e, extra={'stage': 'firestore.batch_commit'})
+                    failures.append({'path': doc_path, 'error': str(e)})
+                
+        with self._lock:
+            self.failures.extend(failures)
+        return failures
+
+    @staticmethod
+    def _apply(batch, operation):
+        kind, doc_ref, data, merge = operation
+        if kind == 'set':
+            batch.set(doc_ref, data, merge=merge)
+        else:
+            batch.update(doc_ref, data)
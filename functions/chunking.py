@@ -0,0 +1,116 @@
+import hashlib
+
+# Average characters per token used to estimate prompt sizes locally,
+# without a token counting request per transcript
+CHARS_PER_TOKEN = 4
+
+# Words grouped into one pseudo-segment when a transcript has no timing data
+WORDS_PER_BLOCK = 100
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in a text"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def format_timestamp(seconds):
+    """Format a transcript offset as h:mm:ss or mm:ss"""
+    seconds = int(seconds)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+def chunk_segments(segments, max_tokens):
+    """
+    Split transcript segments into chunks of at most max_tokens (estimated).
+    Chunks always end on a segment boundary.
+    Returns a list of dicts with the chunk text and its start and end offsets in seconds.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    
+    for segment in segments:
+        segment_tokens = estimate_tokens(segment['text'])
+        if current and current_tokens + segment_tokens > max_tokens:
+            chunks.append(_build_chunk(current))
+            current = []
+            current_tokens = 0
+        current.append(segment)
+        current_tokens += segment_tokens
+        
+    if current:
+        chunks.append(_build_chunk(current))
+    return chunks
+
+def chunk_text(text, max_tokens):
+    """
+    Split a plain transcript into chunks of at most max_tokens (estimated).
+    Used when the timed segments are not available; chunks end on word boundaries.
+    """
+    words = text.split()
+    blocks = [
+        {'text': ' '.join(words[start:start + WORDS_PER_BLOCK]), 'start': None, 'duration': None}
+        for start in range(0, len(words), WORDS_PER_BLOCK)
+    ]
+    return chunk_segments(blocks, max_tokens)
+
+def _build_chunk(segments):
+    last = segments[-1]
+    return {
+        'text': ' '.join(segment['text'] for segment in segments),
+        'start': segments[0]['start'],
+        'end': last['start'] + last['duration'] if last['start'] is not None else None
+    }
+
+def group_texts(texts, max_tokens):
+    """
+    Split texts into consecutive groups of at most max_tokens (estimated) each.
+    A text larger than max_tokens gets a group of its own.
+    """
+    groups = []
+    current = []
+    current_tokens = 0
+    
+    for text in texts:
+        text_tokens = estimate_tokens(text)
+        if current and current_tokens + text_tokens > max_tokens:
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append(text)
+        current_tokens += text_tokens
+        
+    if current:
+        groups.append(current)
+    return groups
+
+def bucket_texts(keyed_texts, max_tokens):
+    """
+    Split (key, text) pairs into groups of about max_tokens each by a hash
+    of their keys, returning (label, texts) pairs.
+
+    A text's group only depends on its key and the number of buckets, so
+    adding, removing or changing one text leaves the other groups as they
+    were. The number of buckets is a power of two, so when it grows each
+    bucket is only split in two. A bucket over max_tokens is split with
+    group_texts, which only shifts the groups within that bucket.
+    """
+    total_tokens = sum(estimate_tokens(text) for _, text in keyed_texts)
+    bucket_count = 1
+    while bucket_count * max_tokens < total_tokens:
+        bucket_count *= 2
+        
+    buckets = {}
+    for key, text in sorted(keyed_texts):
+        bucket = int(hashlib.sha256(key.encode('utf-8')).hexdigest(), 16) % bucket_count
+        buckets.setdefault(bucket, []).append(text)
+        
+    groups = []
+    for bucket in sorted(buckets):
+        parts = group_texts(buckets[bucket], max_tokens)
+        if len(parts) == 1:
+            groups.append((f"{bucket + 1}", parts[0]))
+        else:
+            groups.extend((f"{bucket + 1}-{number}", part) for number, part in enumerate(parts, start=1))
+    return groups
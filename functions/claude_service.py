@@ -1,16 +1,51 @@
 from anthropic import Anthropic
-from firebase_service import FirebaseService
-from config import ANTHROPIC_API_KEY
+from config import (
+    ANTHROPIC_API_KEY,
+    ANTHROPIC_BASE_URL,
+    ANTHROPIC_CONCURRENCY,
+    CHANNEL_SUMMARY_MODE,
+    CLAUDE_MODEL,
+    MASTER_GROUP_TOKENS,
+    TRANSCRIPT_CHUNK_TOKENS
+)
+from concurrency import limit, run_concurrently
+from chunking import estimate_tokens, chunk_segments, chunk_text, format_timestamp, bucket_texts
+from prompt_cache import PromptCache
+from metrics import metrics
+from log import get_logger, log_item
+import hashlib
+import json
 import os
 
+logger = get_logger('claude')
+
+# Generation parameters shared by every summary; they are part of the summary cache key
+CLAUDE_MAX_TOKENS = 4096
+CLAUDE_TEMPERATURE = 0.7
+
+VIDEO_SUMMARY_SYSTEM = "Você é um assistente especializado em criar resumos concisos e informativos de conteúdo em vídeo. Listando os temas discutidos de forma clara"
+CHANNEL_SUMMARY_SYSTEM = "Você é um assistente especializado em analisar conteúdo de canais do YouTube e identificar padrões e temas principais."
+MASTER_SUMMARY_SYSTEM = "Você é um especialista em análise de conteúdo digital, capaz de identificar tendências e conexões entre diferentes canais e tópicos."
+
 class ClaudeService:
     def __init__(self, firebase_service):
-        print("Inicializando serviço do Claude...")
-        self.anthropic = Anthropic(api_key=ANTHROPIC_API_KEY)
+        logger.debug("Inicializando serviço do Claude...")
+        self.anthropic = Anthropic(api_key=ANTHROPIC_API_KEY, base_url=ANTHROPIC_BASE_URL)
         self.firebase_service = firebase_service
+        self.prompt_cache = PromptCache(firebase_service)
 
-    def summarize_transcript(self, transcript, video_title, custom_prompt=None):
-        """Generate a summary of the video transcript using Claude"""
+    def summarize_transcript(self, transcript, video_title, custom_prompt=None, previous_insight=None, cached_only=False, segments=None):
+        """Generate a summary of the video transcript using Claude
+        
+        The result includes a summary_key hashed from the prompt (template,
+        title and transcript), model and generation parameters. When
+        previous_insight was stored with the same key its content is returned
+        without calling Claude, and summary_cached is set. With cached_only,
+        Claude is never called and a cache miss returns has_summary=False.
+        
+        Transcripts longer than TRANSCRIPT_CHUNK_TOKENS are summarized in
+        chunks, split on the timed segments when given, and then combined.
+        """
         if not transcript:
             return {
                 'summary': '',
@@ -18,59 +53,284 @@ class ClaudeService:
             }
 
         try:
-            prompt = ""
-            if custom_prompt:
-                # Use custom prompt if provided
-                prompt = f"{custom_prompt}\n\nVídeo: {video_title}\n\nTranscrição:\n{transcript}"
-            else:
-                # Get prompt from Firebase
-                latest_prompt = self.firebase_service.get_latest_prompt()
-                
-                if not latest_prompt or 'video_summary_prompt' not in latest_prompt:
-                    print("❌ Prompt não encontrado no Firestore")
-                    return {
-                        'summary': '',
-                        'has_summary': False
-                    }
+            prompt = self._build_video_summary_prompt(transcript, video_title, custom_prompt)
+            if not prompt:
+                return {
+                    'summary': '',
+                    'has_summary': False
+                }
 
-                # Replace parameters in prompt template
-                prompt_template = latest_prompt['video_summary_prompt']
-                replacements = {
-                    '%VIDEO_TITLE': video_title,
+            summary_key = self._video_summary_key(transcript, prompt)
+            if previous_insight and previous_insight.get('summary_key') == summary_key and previous_insight.get('content'):
+                log_item(logger, "Resumo em cache reutilizado para o vídeo: %s", video_title, stage='video_summary')
+                return {
+                    'summary': previous_insight['content'],
+                    'has_summary': True,
+                    'summary_key': summary_key,
+                    'summary_cached': True
                 }
                 
-                for key, value in replacements.items():
-                    if value:  # Only replace if value is not empty
-                        prompt_template = prompt_template.replace(key, value)
-
-                prompt = f"{prompt_template}\n{transcript}"
-
-            message = self.anthropic.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4096,
-                temperature=0.7,
-                system="Você é um assistente especializado em criar resumos concisos e informativos de conteúdo em vídeo. Listando os temas discutidos de forma clara",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            if cached_only:
+                return {
+                    'summary': '',
+                    'has_summary': False,
+                    'summary_key': summary_key
+                }
 
-            # Extract just the text content from the message
-            summary_text = message.content[0].text if isinstance(message.content, list) else message.content.text
+            if self.needs_chunking(transcript):
+                summary_text = self._summarize_in_chunks(transcript, video_title, custom_prompt, segments)
+            else:
+                summary_text = self._create_message('video_summary', self._video_summary_params(prompt, custom_prompt))
 
             return {
                 'summary': summary_text,
-                'has_summary': True
+                'has_summary': True,
+                'summary_key': summary_key,
+                'summary_cached': False
             }
         except Exception as e:
-            print(f"❌ Erro ao gerar resumo: {str(e)}")
+            logger.error("Erro ao gerar resumo de %s: %s", video_title, e, extra={'stage': 'video_summary'})
             return {
                 'summary': '',
                 'has_summary': False
             }
 
-    def create_weekly_channel_summary(self, channel_name, videos):
-        """Create a summary of the channel's content for the past week"""
+    def stream_transcript_summary(self, transcript, video_title, custom_prompt=None):
+        """
+        Generate a summary of the video transcript, yielding the text as Claude produces it.
+        Long transcripts are summarized in chunks, so their summary is yielded in one piece.
+        """
+        prompt = self._build_video_summary_prompt(transcript, video_title, custom_prompt)
+        if not prompt:
+            return
+            
+        if self.needs_chunking(transcript):
+            yield self._summarize_in_chunks(transcript, video_title, custom_prompt)
+            return
+            
+        with limit('anthropic'):
+            with self.anthropic.messages.stream(**self._video_summary_params(prompt, custom_prompt)) as stream:
+                for text in stream.text_stream:
+                    yield text
+                message = stream.get_final_message()
+        self._record_usage('video_summary_stream', message.usage)
+
+    def video_summary_key(self, transcript, video_title, custom_prompt=None):
+        """summary_key of a video summary, or None if no prompt template is available"""
+        prompt = self._build_video_summary_prompt(transcript, video_title, custom_prompt)
+        if not prompt:
+            return None
+        return self._video_summary_key(transcript, prompt)
+
+    def _video_summary_key(self, transcript, prompt):
+        if self.needs_chunking(transcript):
+            return self.summary_cache_key(VIDEO_SUMMARY_SYSTEM, prompt, chunk_tokens=TRANSCRIPT_CHUNK_TOKENS)
+        return self.summary_cache_key(VIDEO_SUMMARY_SYSTEM, prompt)
+
+    def needs_chunking(self, transcript):
+        """Whether a transcript is too long to be summarized in a single call"""
+        return estimate_tokens(transcript) > TRANSCRIPT_CHUNK_TOKENS
+
+    def _summarize_in_chunks(self, transcript, video_title, custom_prompt=None, segments=None):
+        """Summarize each chunk of a long transcript in parallel, then combine the partial summaries"""
+        if segments:
+            chunks = chunk_segments(segments, TRANSCRIPT_CHUNK_TOKENS)
+        else:
+            chunks = chunk_text(transcript, TRANSCRIPT_CHUNK_TOKENS)
+        logger.info("Transcrição longa de %s dividida em %d partes", video_title, len(chunks), extra={'stage': 'video_summary'})
+
+        def summarize_chunk(numbered_chunk):
+            number, chunk = numbered_chunk
+            position = f"Parte {number} de {len(chunks)}"
+            if chunk['start'] is not None:
+                position += f" ({format_timestamp(chunk['start'])} - {format_timestamp(chunk['end'])})"
+            prompt = self._build_video_summary_prompt(f"[{position}]\n{chunk['text']}", video_title, custom_prompt)
+            
+            summary_text = self._create_message('video_summary_chunk', self._video_summary_params(prompt, custom_prompt))
+            return f"{position}:\n{summary_text}"
+
+        partial_summaries = run_concurrently(summarize_chunk, list(enumerate(chunks, start=1)), ANTHROPIC_CONCURRENCY)
+        
+        # Reduce: the partial summaries take the place of the transcript in the prompt
+        combined = "\n\n".join(partial_summaries)
+        prompt = self._build_video_summary_prompt(
+            f"A transcrição deste vídeo é longa e foi resumida em partes. "
+            f"Combine os resumos parciais abaixo em um único resumo do vídeo inteiro.\n\n{combined}",
+            video_title,
+            custom_prompt
+        )
+        return self._create_message('video_summary_reduce', self._video_summary_params(prompt, custom_prompt))
+
+    def _build_video_summary_prompt(self, transcript, video_title, custom_prompt=None):
+        """Build the user prompt for a video summary, or None if no prompt template is available"""
+        if custom_prompt:
+            # Use custom prompt if provided
+            return f"{custom_prompt}\n\nVídeo: {video_title}\n\nTranscrição:\n{transcript}"
+            
+        # Get prompt from the cached Firebase prompts
+        prompt_template = self.prompt_cache.get_template('video_summary_prompt')
+        
+        if not prompt_template:
+            logger.error("Prompt não encontrado no Firestore")
+            return None
+
+        # The template goes first unchanged so it is cached, followed by the parameter values
+        return f"{prompt_template.render_cacheable(VIDEO_TITLE=video_title)}\n{transcript}"
+
+    def _video_summary_params(self, prompt, custom_prompt=None):
+        """Parameters of the messages.create call that summarizes a video"""
+        if custom_prompt:
+            cached_prefix = custom_prompt
+        else:
+            prompt_template = self.prompt_cache.get_template('video_summary_prompt')
+            cached_prefix = prompt_template.template if prompt_template else ''
+        return self._message_params(VIDEO_SUMMARY_SYSTEM, prompt, cached_prefix)
+
+    def _message_params(self, system, prompt, cached_prefix=''):
+        """
+        Parameters of a messages.create call with prompt caching breakpoints.
+        
+        The system text and the part of the prompt that is the same on every
+        call (cached_prefix, the whole prompt template) are marked with
+        cache_control, so the provider can reuse them across calls.
+        Prefixes shorter than the model's minimum cacheable length are simply
+        not cached.
+        """
+        content = []
+        if cached_prefix.strip() and prompt.startswith(cached_prefix) and prompt[len(cached_prefix):].strip():
+            content.append({"type": "text", "text": cached_prefix, "cache_control": {"type": "ephemeral"}})
+            content.append({"type": "text", "text": prompt[len(cached_prefix):]})
+        else:
+            content.append({"type": "text", "text": prompt})
+            
+        return {
+            'model': CLAUDE_MODEL,
+            'max_tokens': CLAUDE_MAX_TOKENS,
+            'temperature': CLAUDE_TEMPERATURE,
+            'system': [
+                {"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}
+            ],
+            'messages': [
+                {"role": "user", "content": content}
+            ]
+        }
+
+    def _create_message(self, call_name, params):
+        """Call messages.create, record its token usage and return the response text"""
+        with limit('anthropic'), metrics.timer(f"anthropic.{call_name}"):
+            message = self.anthropic.messages.create(**params)
+        self._record_usage(call_name, message.usage)
+        
+        # Extract just the text content from the message
+        return message.content[0].text if isinstance(message.content, list) else message.content.text
+
+    def _record_usage(self, call_name, usage):
+        """
+        Count the token usage of a call in the run metrics, including prompt
+        cache reads and writes, both in total and per call name.
+        """
+        usage_data = {
+            'call': call_name,
+            'input_tokens': usage.input_tokens,
+            'output_tokens': usage.output_tokens,
+            'cache_creation_input_tokens': usage.cache_creation_input_tokens or 0,
+            'cache_read_input_tokens': usage.cache_read_input_tokens or 0
+        }
+        metrics.increment('anthropic.calls')
+        metrics.increment(f"anthropic.{call_name}.calls")
+        for field in ('input_tokens', 'output_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens'):
+            metrics.increment(f"anthropic.{field}", usage_data[field])
+            metrics.increment(f"anthropic.{call_name}.{field}", usage_data[field])
+        log_item(logger, "Uso de tokens (%s)", call_name, stage=f"anthropic.{call_name}", **usage_data)
+
+    def submit_summary_batch(self, videos):
+        """
+        Submit the summaries of many videos as one Message Batch.
+        Returns the batch ID and, per video ID, the title and summary_key
+        needed to save the results as insights, or None if nothing was submitted.
+        """
+        requests = []
+        batch_videos = {}
+        for video in videos:
+            prompt = self._build_video_summary_prompt(video['transcript'], video['title'])
+            if not prompt:
+                return None
+                
+            # custom_id only accepts letters, digits, '-' and '_', like YouTube video IDs
+            requests.append({
+                'custom_id': video['id'],
+                'params': self._video_summary_params(prompt)
+            })
+            batch_videos[video['id']] = {
+                'title': video['title'],
+                'summary_key': self.summary_cache_key(VIDEO_SUMMARY_SYSTEM, prompt)
+            }
+            
+        if not requests:
+            return None
+            
+        with limit('anthropic'):
+            batch = self.anthropic.messages.batches.create(requests=requests)
+        logger.info("Lote de resumos %s enviado com %d vídeos", batch.id, len(requests), extra={'stage': 'summary_batch'})
+        
+        return {
+            'batch_id': batch.id,
+            'videos': batch_videos
+        }
+
+    def get_summary_batch_results(self, batch_id):
+        """
+        Get the results of a Message Batch.
+        Returns None while the batch is processing, otherwise a dict with the
+        summary data of each video ID.
+        """
+        with limit('anthropic'):
+            batch = self.anthropic.messages.batches.retrieve(batch_id)
+        if batch.processing_status != 'ended':
+            logger.info("Lote de resumos %s ainda em processamento: %d pendentes", batch_id, batch.request_counts.processing,
+                        extra={'stage': 'summary_batch'})
+            return None
+            
+        results = {}
+        with limit('anthropic'):
+            for entry in self.anthropic.messages.batches.results(batch_id):
+                if entry.result.type == 'succeeded':
+                    message = entry.result.message
+                    self._record_usage('video_summary_batch', message.usage)
+                    results[entry.custom_id] = {
+                        'summary': message.content[0].text,
+                        'has_summary': True
+                    }
+                else:
+                    logger.error("Erro ao gerar resumo em lote: %s", entry.result.type,
+                                 extra={'stage': 'summary_batch', 'video_id': entry.custom_id})
+                    results[entry.custom_id] = {
+                        'summary': '',
+                        'has_summary': False
+                    }
+        return results
+
+    def summary_cache_key(self, system, prompt, **parameters):
+        """Hash of everything that determines a Claude summary, including extra parameters"""
+        key_data = json.dumps({
+            'model': CLAUDE_MODEL,
+            'max_tokens': CLAUDE_MAX_TOKENS,
+            'temperature': CLAUDE_TEMPERATURE,
+            'system': system,
+            'prompt': prompt,
+            **parameters
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
+
+    def create_weekly_channel_summary(self, channel_name, videos, previous_summary=None):
+        """Create a summary of the channel's content for the past week
+        
+        previous_summary is the channel's latest summary insight. In incremental
+        mode it is returned as is when it covers exactly the same video
+        summaries, and updated with the new videos only when it covers a subset
+        of them. Otherwise (or in full mode) the summary is regenerated.
+        The result includes video_summary_keys, the videos it covers.
+        """
         try:
             # Filter videos with summaries
             videos_with_summaries = [v for v in videos if v.get('has_summary', False)]
@@ -81,56 +341,133 @@ class ClaudeService:
                     'has_weekly_summary': False
                 }
 
-            # Get prompt from Firebase
-            latest_prompt = self.firebase_service.get_latest_prompt()
-            if not latest_prompt or 'channel_weekly_summary_prompt' not in latest_prompt:
-                print("❌ Prompt não encontrado no Firestore")
+            # Get prompt from the cached Firebase prompts
+            prompt_template = self.prompt_cache.get_template('channel_weekly_summary_prompt')
+            if not prompt_template:
+                logger.error("Prompt não encontrado no Firestore")
                 return {
                     'weekly_summary': '',
                     'has_weekly_summary': False
                 }
 
-            # Replace parameters in prompt template
-            prompt_template = latest_prompt['channel_weekly_summary_prompt']
-            replacements = {
-                '%CHANNEL_NAME': channel_name,
-            }
-            
-            for key, value in replacements.items():
-                if value:  # Only replace if value is not empty
-                    prompt_template = prompt_template.replace(key, value)
+            video_summary_keys = {v['id']: v.get('summary_key', '') for v in videos_with_summaries}
+            previous_keys = {}
+            if CHANNEL_SUMMARY_MODE == 'incremental' and previous_summary and previous_summary.get('content'):
+                previous_keys = previous_summary.get('video_summary_keys') or {}
+
+            if previous_keys and previous_keys == video_summary_keys:
+                logger.info("Nenhum vídeo novo para %s, reutilizando resumo semanal anterior", channel_name, extra={'stage': 'channel_summary'})
+                return {
+                    'weekly_summary': previous_summary['content'],
+                    'has_weekly_summary': True,
+                    'weekly_summary_cached': True,
+                    'video_summary_keys': video_summary_keys
+                }
+
+            # Incremental update is possible when every video of the previous summary is unchanged
+            incremental = bool(previous_keys) and all(
+                video_summary_keys.get(video_id) == summary_key
+                for video_id, summary_key in previous_keys.items()
+            )
+            if incremental:
+                new_videos = [v for v in videos_with_summaries if v['id'] not in previous_keys]
+                logger.info("Atualizando resumo semanal de %s com %d vídeos novos", channel_name, len(new_videos), extra={'stage': 'channel_summary'})
+            else:
+                new_videos = videos_with_summaries
 
             # Create a comprehensive prompt with all video information
             videos_info = "\n\n".join([
                 f"Vídeo: {v['title']}\nResumo: {v['summary']}"
-                for v in videos_with_summaries
+                for v in new_videos
             ])
 
-            prompt = f"{prompt_template}\n{videos_info}"
+            # The template goes first unchanged so it is cached, followed by the parameter values
+            if not incremental:
+                prompt = f"{prompt_template.render_cacheable(CHANNEL_NAME=channel_name)}\n{videos_info}"
+            else:
+                prompt = (
+                    f"{prompt_template.render_cacheable(CHANNEL_NAME=channel_name)}\n"
+                    f"Resumo anterior da semana:\n{previous_summary['content']}\n\n"
+                    f"Atualize o resumo anterior incluindo os vídeos novos abaixo:\n\n{videos_info}"
+                )
 
-            message = self.anthropic.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4096,
-                temperature=0.7,
-                system="Você é um assistente especializado em analisar conteúdo de canais do YouTube e identificar padrões e temas principais.",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
+            summary_text = self._create_message(
+                'channel_summary',
+                self._message_params(CHANNEL_SUMMARY_SYSTEM, prompt, prompt_template.template)
             )
 
-            summary_text = message.content[0].text if isinstance(message.content, list) else message.content.text
-
             return {
                 'weekly_summary': summary_text,
-                'has_weekly_summary': True
+                'has_weekly_summary': True,
+                'weekly_summary_cached': False,
+                'video_summary_keys': video_summary_keys
             }
         except Exception as e:
-            print(f"❌ Erro ao gerar resumo semanal do canal: {str(e)}")
+            logger.error("Erro ao gerar resumo semanal do canal %s: %s", channel_name, e, extra={'stage': 'channel_summary'})
             return {
                 'weekly_summary': '',
                 'has_weekly_summary': False
             }
 
+    def _reduce_channel_summaries(self, channel_summaries, prompt_template):
+        """
+        Tree-reduce channel summaries until they fit in MASTER_GROUP_TOKENS.
+        
+        Channels are assigned to groups by a hash of their ID (see
+        bucket_texts), so a changed channel doesn't move the others to other
+        groups. Each group summary is cached in Firestore by a hash of its
+        prompt, so only groups whose channel summaries changed are sent to
+        Claude again.
+        """
+        sections = [
+            (summary.get('channel_id') or summary['channel_title'], f"Canal: {summary['channel_title']}\n{summary['summary']}")
+            for summary in channel_summaries
+        ]
+        
+        group_prompt = self.prompt_cache.get_template('master_group_summary_prompt')
+        if group_prompt:
+            instructions = group_prompt.render()
+        else:
+            instructions = (
+                f"{prompt_template.render()}\n\n"
+                "Os resumos abaixo são apenas uma parte dos canais acompanhados. Resuma este grupo "
+                "preservando os temas, tendências e canais citados, pois o resultado será combinado "
+                "com os resumos dos outros grupos."
+            )
+
+        level = 1
+        while len(sections) > 1 and estimate_tokens("\n\n".join(text for _, text in sections)) > MASTER_GROUP_TOKENS:
+            groups = bucket_texts(sections, MASTER_GROUP_TOKENS)
+            if len(groups) == len(sections):
+                # No two summaries fit in one group, another level wouldn't make them shorter
+                break
+            logger.info("Resumo master nível %d: %d resumos em %d grupos", level, len(sections), len(groups), extra={'stage': 'master_summary'})
+
+            def summarize_group(labeled_group):
+                label, group = labeled_group
+                prompt = f"{instructions}\n\n" + "\n\n".join(group)
+                summary_key = self.summary_cache_key(MASTER_SUMMARY_SYSTEM, prompt)
+                
+                cached = self.firebase_service.get_group_summary(summary_key)
+                if cached:
+                    summary_text = cached['summary']
+                else:
+                    summary_text = self._create_message(
+                        'master_group_summary',
+                        self._message_params(MASTER_SUMMARY_SYSTEM, prompt, instructions)
+                    )
+                    self.firebase_service.save_group_summary(summary_key, {
+                        'summary': summary_text,
+                        'level': level
+                    })
+                # The group label is the key of its summary in the next level
+                return label, f"Grupo {level}.{label}:\n{summary_text}"
+
+            sections = run_concurrently(summarize_group, groups, ANTHROPIC_CONCURRENCY)
+            level += 1
+
+        return "\n\n".join(text for _, text in sections)
+
     def create_master_weekly_summary(self, channel_summaries):
         """Create a consolidated summary of all channels' weekly content"""
         try:
@@ -140,10 +477,10 @@ class ClaudeService:
                     'has_master_summary': False
                 }
 
-            # Get prompt from Firebase
-            latest_prompt = self.firebase_service.get_latest_prompt()
-            if not latest_prompt or 'master_weekly_summary_prompt' not in latest_prompt:
-                print("❌ Prompt não encontrado no Firestore")
+            # Get prompt from the cached Firebase prompts
+            prompt_template = self.prompt_cache.get_template('master_weekly_summary_prompt')
+            if not prompt_template:
+                logger.error("Prompt não encontrado no Firestore")
                 return {
                     'master_summary': '',
                     'has_master_summary': False
@@ -155,26 +492,23 @@ class ClaudeService:
                 for summary in channel_summaries
             ])
 
-            prompt = f"{latest_prompt['master_weekly_summary_prompt']}\n\n{channels_info}"
+            # Too many channels for one prompt: reduce them in token-bounded groups first
+            if estimate_tokens(channels_info) > MASTER_GROUP_TOKENS:
+                channels_info = self._reduce_channel_summaries(channel_summaries, prompt_template)
 
-            message = self.anthropic.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4096,
-                temperature=0.7,
-                system="Você é um especialista em análise de conteúdo digital, capaz de identificar tendências e conexões entre diferentes canais e tópicos.",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            prompt = f"{prompt_template.render()}\n\n{channels_info}"
 
-            summary_text = message.content[0].text if isinstance(message.content, list) else message.content.text
+            summary_text = self._create_message(
+                'master_summary',
+                self._message_params(MASTER_SUMMARY_SYSTEM, prompt, prompt_template.render())
+            )
 
             return {
                 'master_summary': summary_text,
                 'has_master_summary': True
             }
         except Exception as e:
-            print(f"❌ Erro ao gerar resumo master semanal: {str(e)}")
+            logger.error("Erro ao gerar resumo master semanal: %s", e, extra={'stage': 'master_summary'})
             return {
                 'master_summary': '',
                 'has_master_summary': False
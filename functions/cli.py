@@ -1,6 +1,6 @@
 import argparse
-from firebase_service import FirebaseService
-from datetime import datetime
+from services import get_firebase_service
+from datetime import datetime, timezone
 
 def add_channel_command():
     """
@@ -20,23 +20,27 @@ def add_channel_command():
     
     try:
         # Initialize Firebase and add channel
-        firebase = FirebaseService()
+        firebase = get_firebase_service()
         firebase.add_channel(channel_name, channel_url)
         print(f"\nSuccess! Channel '{channel_name}' added with PENDING status")
     except Exception as e:
         print(f"Error adding channel: {str(e)}")
 
-def show_channels_updates_command():
+def show_channels_updates_command(limit=None, since=None):
     """
     CLI command to show the last_updated field for all channels.
-    Fetches and displays channel update information.
+    Fetches and displays channel update information, optionally only the
+    channels updated since a date and at most limit channels.
     """
     print("\n=== Canais e Datas de Atualização ===")
     
     try:
         # Initialize Firebase and fetch data
-        firebase = FirebaseService()
+        firebase = get_firebase_service()
         channels_data = firebase.get_channels_last_updated()
+        if since:
+            channels_data = [channel for channel in channels_data if channel['last_updated'] >= since]
+        channels_data = channels_data[:limit]
         
         if not channels_data:
             print("Nenhum canal encontrado com dados de atualização.")
@@ -65,29 +69,28 @@ def show_channels_updates_command():
     except Exception as e:
         print(f"Erro ao buscar datas de atualização dos canais: {str(e)}")
 
-def show_videos_updates_command():
+def show_videos_updates_command(limit=None, since=None, channel_id=None):
     """
     CLI command to show the last_updated field for all videos.
-    Fetches and displays video update information.
+    Rows are printed page by page as Firestore returns them, most recently
+    updated first, optionally filtered by channel and update date.
     """
     print("\n=== Vídeos e Datas de Atualização ===")
     
     try:
         # Initialize Firebase and fetch data
-        firebase = FirebaseService()
-        videos_data = firebase.get_videos_last_updated()
+        firebase = get_firebase_service()
+        videos_data = firebase.iter_videos_last_updated(channel_id=channel_id, since=since, max_results=limit)
         
-        if not videos_data:
-            print("Nenhum vídeo encontrado com dados de atualização.")
-            return
-            
         # Print header
         print("-" * 140)
         print(f"{'ID':<15} | {'TÍTULO':<40} | {'CANAL':<25} | {'PUBLICADO EM':<20} | {'ATUALIZADO EM':<20}")
         print("-" * 140)
         
-        # Print each video
+        # Print each video as it arrives
+        total = 0
         for video in videos_data:
+            total += 1
             # Format the dates for display
             updated_str = video['last_updated'].strftime("%d/%m/%Y %H:%M:%S") if isinstance(video['last_updated'], datetime) else str(video['last_updated'])
             published_str = video['published_at'].strftime("%d/%m/%Y %H:%M:%S") if isinstance(video.get('published_at'), datetime) else str(video.get('published_at', 'N/A'))
@@ -97,10 +100,13 @@ def show_videos_updates_command():
             id_str = video['id'][:12] + "..." if len(video['id']) > 15 else video['id'].ljust(15)
             channel = video['channel_id'][:22] + "..." if len(video['channel_id']) > 25 else video['channel_id'].ljust(25)
             
-            print(f"{id_str} | {title} | {channel} | {published_str:<20} | {updated_str:<20}")
+            print(f"{id_str} | {title} | {channel} | {published_str:<20} | {updated_str:<20}", flush=True)
         
         print("-" * 140)
-        print(f"Total de vídeos: {len(videos_data)}")
+        if not total:
+            print("Nenhum vídeo encontrado com dados de atualização.")
+            return
+        print(f"Total de vídeos: {total}")
             
     except Exception as e:
         print(f"Erro ao buscar datas de atualização dos vídeos: {str(e)}")
@@ -112,27 +118,79 @@ def process_transcripts_command():
     from scraper import process_missing_transcripts
     process_missing_transcripts()
 
+def process_summary_batches_command():
+    """
+    CLI command to collect the results of pending Message Batches of video summaries.
+    """
+    from scraper import process_summary_batches
+    process_summary_batches()
+
+def backfill_has_transcript_command():
+    """
+    CLI command to set has_transcript on videos saved before it was always written.
+    """
+    print("\n=== Preenchendo has_transcript ===")
+    
+    try:
+        firebase = get_firebase_service()
+        firebase.backfill_has_transcript()
+    except Exception as e:
+        print(f"Erro ao preencher has_transcript: {str(e)}")
+
+def migrate_transcripts_command():
+    """
+    CLI command to move transcripts stored inside video documents to the transcript subcollection.
+    """
+    print("\n=== Migrando transcrições ===")
+    
+    try:
+        firebase = get_firebase_service()
+        firebase.migrate_inline_transcripts()
+    except Exception as e:
+        print(f"Erro ao migrar transcrições: {str(e)}")
+
+def parse_date(value):
+    """Parse a --since value (YYYY-MM-DD or ISO 8601); dates without a timezone are UTC"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data inválida: {value} (use AAAA-MM-DD)")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
 def handle_cli_commands():
     """Handle CLI commands and arguments"""
     parser = argparse.ArgumentParser(description='YouTube Channel Manager')
-    parser.add_argument('--action', type=str, help='Action to perform (add_channel, show_channels_updates, show_videos_updates, process_transcripts)')
+    parser.add_argument('--action', type=str, help='Action to perform (add_channel, show_channels_updates, show_videos_updates, process_transcripts, process_summary_batches, backfill_has_transcript, migrate_transcripts)')
+    parser.add_argument('--limit', type=int, help='show_*_updates: maximum number of rows')
+    parser.add_argument('--since', type=parse_date, help='show_*_updates: only items updated since this date (YYYY-MM-DD)')
+    parser.add_argument('--channel', type=str, help='show_videos_updates: only videos of this channel ID')
     
     args = parser.parse_args()
     
     if args.action == 'add_channel':
         add_channel_command()
     elif args.action == 'show_channels_updates':
-        show_channels_updates_command()
+        show_channels_updates_command(limit=args.limit, since=args.since)
     elif args.action == 'show_videos_updates':
-        show_videos_updates_command()
+        show_videos_updates_command(limit=args.limit, since=args.since, channel_id=args.channel)
     elif args.action == 'process_transcripts':
         process_transcripts_command()
+    elif args.action == 'process_summary_batches':
+        process_summary_batches_command()
+    elif args.action == 'backfill_has_transcript':
+        backfill_has_transcript_command()
+    elif args.action == 'migrate_transcripts':
+        migrate_transcripts_command()
     else:
         print("\nComandos disponíveis:")
         print("  --action add_channel           : Adicionar um novo canal do YouTube")
         print("  --action show_channels_updates : Mostrar datas de atualização dos canais")
         print("  --action show_videos_updates   : Mostrar datas de atualização dos vídeos")
+        print("      [--limit N] [--since AAAA-MM-DD] [--channel ID_DO_CANAL]")
         print("  --action process_transcripts   : Processar transcrições faltantes dos vídeos")
+        print("  --action process_summary_batches : Coletar resultados dos lotes de resumos pendentes")
+        print("  --action backfill_has_transcript : Preencher has_transcript em vídeos antigos")
+        print("  --action migrate_transcripts   : Mover transcrições dos vídeos para a subcoleção")
         return False
     
     return True 
\ No newline at end of file
@@ -0,0 +1,51 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+from metrics import metrics
+from config import (
+    YOUTUBE_CONCURRENCY,
+    TRANSCRIPT_CONCURRENCY,
+    FIRESTORE_CONCURRENCY,
+    ANTHROPIC_CONCURRENCY
+)
+
+# One semaphore per external service, shared by every worker thread
+_service_limits = {
+    'youtube': threading.BoundedSemaphore(YOUTUBE_CONCURRENCY),
+    'transcripts': threading.BoundedSemaphore(TRANSCRIPT_CONCURRENCY),
+    'firestore': threading.BoundedSemaphore(FIRESTORE_CONCURRENCY),
+    'anthropic': threading.BoundedSemaphore(ANTHROPIC_CONCURRENCY),
+}
+
+@contextmanager
+def limit(service):
+    """Block until a call slot for the given service is available"""
+    with _service_limits[service]:
+        yield
+
+def limited(service):
+    """
+    Decorator version of limit() for methods that make a single service call.
+    Each call is also timed in the run metrics as '<service>.<method name>'.
+    """
+    def decorator(func):
+        stage = f"{service}.{func.__name__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with limit(service), metrics.timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def run_concurrently(func, items, max_workers):
+    """
+    Run func for every item using a bounded thread pool.
+    Returns the results in the same order as items.
+    """
+    if not items:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as executor:
+        return list(executor.map(func, items))
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,8 +9,91 @@ FIREBASE_PROJECT_ID = os.getenv('FIREBASE_PROJECT_ID')
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
 ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
 
-print("API Keys found:")
-print(f"YouTube API Key: {YOUTUBE_API_KEY}")
-print(f"Firebase Project ID: {FIREBASE_PROJECT_ID}")
-print(f"Google Application Credentials: {GOOGLE_APPLICATION_CREDENTIALS}")
-print(f"Anthropic API Key: {ANTHROPIC_API_KEY}")
+# Logging: level, 'json' (structured lines for Cloud Logging) or 'text', and
+# how many per-item messages (one per video, document...) share one INFO line
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_SAMPLE_EVERY = max(1, int(os.getenv('LOG_SAMPLE_EVERY', '100')))
+
+# Concurrency limits for a full run: number of channels processed at once and
+# maximum simultaneous calls to each external service
+CHANNEL_WORKERS = int(os.getenv('CHANNEL_WORKERS', '8'))
+YOUTUBE_CONCURRENCY = int(os.getenv('YOUTUBE_CONCURRENCY', '8'))
+TRANSCRIPT_CONCURRENCY = int(os.getenv('TRANSCRIPT_CONCURRENCY', '4'))
+FIRESTORE_CONCURRENCY = int(os.getenv('FIRESTORE_CONCURRENCY', '16'))
+ANTHROPIC_CONCURRENCY = int(os.getenv('ANTHROPIC_CONCURRENCY', '4'))
+
+# Transcript cache: local SQLite file (in /tmp on Cloud Functions) backed by Firestore.
+# Videos without transcripts are remembered for TRANSCRIPT_NEGATIVE_TTL_HOURS
+# because automatic captions may show up some hours after upload.
+TRANSCRIPT_CACHE_PATH = os.getenv('TRANSCRIPT_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'transcript_cache.sqlite3'))
+TRANSCRIPT_NEGATIVE_TTL_HOURS = float(os.getenv('TRANSCRIPT_NEGATIVE_TTL_HOURS', '12'))
+
+# YouTube Data API responses are kept in a local SQLite file with their ETags;
+# repeated requests are sent with If-None-Match and unchanged responses (304)
+# are served from it without transferring the payload again
+YOUTUBE_HTTP_CACHE = os.getenv('YOUTUBE_HTTP_CACHE', 'true').lower() == 'true'
+YOUTUBE_HTTP_CACHE_PATH = os.getenv('YOUTUBE_HTTP_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'youtube_http_cache.sqlite3'))
+YOUTUBE_HTTP_CACHE_MAX_AGE_HOURS = float(os.getenv('YOUTUBE_HTTP_CACHE_MAX_AGE_HOURS', '168'))
+
+# Transcript API throttling: token bucket shared by all workers and jittered
+# exponential backoff when YouTube answers with "too many requests"
+TRANSCRIPT_RATE_PER_SECOND = float(os.getenv('TRANSCRIPT_RATE_PER_SECOND', '2'))
+TRANSCRIPT_BURST = int(os.getenv('TRANSCRIPT_BURST', '4'))
+TRANSCRIPT_MAX_RETRIES = int(os.getenv('TRANSCRIPT_MAX_RETRIES', '5'))
+TRANSCRIPT_BACKOFF_BASE_SECONDS = float(os.getenv('TRANSCRIPT_BACKOFF_BASE_SECONDS', '2'))
+TRANSCRIPT_BACKOFF_MAX_SECONDS = float(os.getenv('TRANSCRIPT_BACKOFF_MAX_SECONDS', '60'))
+
+# Buffered Firestore writes: a batch is committed when it reaches
+# FIRESTORE_BATCH_SIZE operations (Firestore allows 500) or when its oldest
+# write has waited FIRESTORE_FLUSH_SECONDS
+FIRESTORE_BATCH_SIZE = int(os.getenv('FIRESTORE_BATCH_SIZE', '500'))
+FIRESTORE_FLUSH_SECONDS = float(os.getenv('FIRESTORE_FLUSH_SECONDS', '5'))
+
+# Prompt templates are read from Firestore at most once per PROMPT_CACHE_TTL_SECONDS.
+# With PROMPT_CACHE_WATCH a snapshot listener keeps them up to date instead.
+PROMPT_CACHE_TTL_SECONDS = float(os.getenv('PROMPT_CACHE_TTL_SECONDS', '300'))
+PROMPT_CACHE_WATCH = os.getenv('PROMPT_CACHE_WATCH', 'false').lower() == 'true'
+
+# Claude model used for every summary
+CLAUDE_MODEL = os.getenv('CLAUDE_MODEL', 'claude-3-sonnet-20240229')
+
+# Anthropic API endpoint; point it to a local stub server for testing
+ANTHROPIC_BASE_URL = os.getenv('ANTHROPIC_BASE_URL') or None
+
+# Video summaries are generated one call at a time ('sync') or submitted
+# together through the Message Batches API ('batch'). A run waits at most
+# SUMMARY_BATCH_WAIT_SECONDS for batch results; unfinished batches are
+# collected by the next run.
+SUMMARY_MODE = os.getenv('SUMMARY_MODE', 'sync')
+SUMMARY_BATCH_WAIT_SECONDS = float(os.getenv('SUMMARY_BATCH_WAIT_SECONDS', '120'))
+SUMMARY_BATCH_POLL_SECONDS = float(os.getenv('SUMMARY_BATCH_POLL_SECONDS', '15'))
+
+# Transcripts longer than TRANSCRIPT_CHUNK_TOKENS (estimated) are split into
+# chunks that are summarized in parallel and then combined
+TRANSCRIPT_CHUNK_TOKENS = int(os.getenv('TRANSCRIPT_CHUNK_TOKENS', '20000'))
+
+# 'incremental' updates the previous weekly channel summary with new videos only
+# (and skips Claude when nothing changed); 'full' always regenerates it
+CHANNEL_SUMMARY_MODE = os.getenv('CHANNEL_SUMMARY_MODE', 'incremental')
+
+# When all channel summaries exceed MASTER_GROUP_TOKENS (estimated), they are
+# summarized in groups of that size first and the group summaries are merged
+MASTER_GROUP_TOKENS = int(os.getenv('MASTER_GROUP_TOKENS', '40000'))
+
+# Before any other work on a channel, its latest upload is read from the RSS
+# feed (no quota); channels with nothing new since their last complete run
+# reuse their stored weekly summary instead of being processed again
+SKIP_UNCHANGED_CHANNELS = os.getenv('SKIP_UNCHANGED_CHANNELS', 'true').lower() == 'true'
+
+# 'local' processes every channel inside the invocation that starts the run;
+# 'fanout' enqueues one task per channel and lets worker functions process
+# them in parallel, the last one to finish generating the master summary.
+# WORK_QUEUE_BACKEND is 'firestore' (deployed) or 'memory' (in-process workers).
+PROCESS_MODE = os.getenv('PROCESS_MODE', 'local')
+WORK_QUEUE_BACKEND = os.getenv('WORK_QUEUE_BACKEND', 'firestore')
+WORK_QUEUE_LEASE_SECONDS = float(os.getenv('WORK_QUEUE_LEASE_SECONDS', '600'))
+WORK_QUEUE_MAX_ATTEMPTS = int(os.getenv('WORK_QUEUE_MAX_ATTEMPTS', '3'))
+
+# Optional file where each run also writes its metrics in OpenMetrics text format
+METRICS_OPENMETRICS_PATH = os.getenv('METRICS_OPENMETRICS_PATH')
@@ -1,72 +1,254 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
 from datetime import datetime
+import gzip
 import os
 from config import FIREBASE_PROJECT_ID, GOOGLE_APPLICATION_CREDENTIALS
+from concurrency import limit, limited
+from batch_writer import BatchWriter
+from metrics import metrics
+from log import get_logger, log_item
+
+logger = get_logger('firebase')
+
+# Transcripts are stored gzip-compressed outside the video document, in the
+# videos/{id}/transcript subcollection, split in parts below Firestore's
+# 1 MiB document limit. The video document keeps the part count and sizes.
+TRANSCRIPT_SUBCOLLECTION = 'transcript'
+TRANSCRIPT_PART_BYTES = 900 * 1024
+TRANSCRIPT_ENCODING = 'gzip'
+
+# Video fields needed to load its transcript; 'transcript' is only present on
+# videos saved before transcripts were moved out of the video document
+VIDEO_TRANSCRIPT_FIELDS = ['transcript', 'transcript_parts', 'transcript_encoding']
+
+# Documents read per request when listing a whole collection
+LISTING_PAGE_SIZE = 500
+
+# Every video field except the transcript text
+VIDEO_METADATA_FIELDS = [
+    'title', 'description', 'channel_id', 'published_at', 'thumbnail_url',
+    'view_count', 'like_count', 'comment_count', 'duration',
+    'has_transcript', 'transcript_language', 'transcript_size', 'transcript_compressed_size',
+    'transcript_parts', 'transcript_encoding', 'updated_at'
+]
 
 class FirebaseService:
     def __init__(self):
-        print("Inicializando serviço do Firebase...")
+        logger.debug("Inicializando serviço do Firebase...")
         
         # Check if Firebase app is already initialized
         if not firebase_admin._apps:
             # When running in Cloud Functions, the environment is already authenticated
             # Only use credentials file when running locally
             if GOOGLE_APPLICATION_CREDENTIALS:
-                print(f"Usando credenciais do arquivo local")
+                logger.info("Usando credenciais do arquivo local")
                 cred = credentials.Certificate(GOOGLE_APPLICATION_CREDENTIALS)
                 firebase_admin.initialize_app(cred, {
                     'projectId': FIREBASE_PROJECT_ID,
                 })
             else:
-                print("Usando autenticação do ambiente cloud")
+                logger.info("Usando autenticação do ambiente cloud")
                 firebase_admin.initialize_app()
                 
         self.db = firestore.client()
 
+    @limited('firestore')
     def get_channels(self):
         """Get all channels from Firestore"""
-        print("Buscando lista de canais do Firestore...")
+        logger.debug("Buscando lista de canais do Firestore...")
         channels_ref = self.db.collection('channels')
-        channels = [doc.id for doc in channels_ref.stream()]
-        print(f"Total de canais encontrados: {len(channels)}")
+        channels = [doc.id for doc in self._counted(channels_ref.stream())]
+        logger.info("Total de canais encontrados: %d", len(channels))
         return channels
 
-    def save_channel_data(self, channel_data):
+    def _counted(self, docs):
+        """Count every document read from a query in the run metrics"""
+        for doc in docs:
+            metrics.increment('firestore.reads')
+            yield doc
+
+    def batch_writer(self):
+        """Create a BatchWriter that groups writes into batched commits"""
+        return BatchWriter(self.db)
+
+    def _set(self, doc_ref, data, merge=False, writer=None):
+        """Write through the batch writer when one is given, otherwise immediately"""
+        if writer:
+            writer.set(doc_ref, data, merge=merge)
+            return
+        with limit('firestore'), metrics.timer('firestore.set'):
+            doc_ref.set(data, merge=merge)
+        metrics.increment('firestore.writes')
+
+    def _set_group(self, writes, writer=None):
+        """Write [(doc_ref, data, merge)] atomically, through the batch writer when one is given"""
+        if writer:
+            writer.set_group(writes)
+            return
+        batch = self.db.batch()
+        for doc_ref, data, merge in writes:
+            batch.set(doc_ref, data, merge=merge)
+        with limit('firestore'), metrics.timer('firestore.batch_commit'):
+            batch.commit()
+        metrics.increment('firestore.writes', len(writes))
+
+    def save_channel_data(self, channel_data, writer=None):
         """Save or update channel data"""
         doc_id = channel_data.pop('doc_id', None)  # Remove doc_id from data to be saved
         if not doc_id:
-            print("❌ Erro: doc_id não fornecido para atualização do canal")
+            logger.error("doc_id não fornecido para atualização do canal")
             return
         
-        print(f"Atualizando dados do canal: {channel_data.get('title', '')}")
+        log_item(logger, "Atualizando dados do canal: %s", channel_data.get('title', ''), channel_id=channel_data.get('channel_id') or channel_data.get('id'))
         channel_ref = self.db.collection('channels').document(doc_id)
         channel_data['updated_at'] = datetime.now()
-        channel_ref.set(channel_data, merge=True)
+        self._set(channel_ref, channel_data, merge=True, writer=writer)
 
-    def save_video_data(self, video_data):
-        # print("save_video_data ->  video_data", video_data)
-        """Save or update video data"""
-        print(f"Salvando dados do vídeo: {video_data['title']}")
+    def save_video_data(self, video_data, writer=None):
+        """Save or update video data
+        
+        The transcript text is written to the transcript subcollection and only
+        its pointer fields are stored on the video document. Both are committed
+        in the same batch, so the document never points to missing parts.
+        """
+        log_item(logger, "Salvando dados do vídeo: %s", video_data['title'], video_id=video_data.get('id'))
+        # has_transcript must always be present for get_videos_without_transcript
+        if 'has_transcript' not in video_data and 'transcript' in video_data:
+            video_data['has_transcript'] = bool(video_data['transcript'])
         video_ref = self.db.collection('videos').document(video_data['id'])
         video_data['updated_at'] = datetime.now()
-        video_ref.set(video_data, merge=True)
+        
+        document_data = {key: value for key, value in video_data.items() if key != 'transcript'}
+        if 'transcript' not in video_data:
+            self._set(video_ref, document_data, merge=True, writer=writer)
+            return
+            
+        part_writes, pointer = self._transcript_writes(video_ref, video_data['transcript'])
+        self._set_group(part_writes + [(video_ref, {**document_data, **pointer}, True)], writer=writer)
+
+    def _transcript_writes(self, video_ref, transcript):
+        """The writes of the compressed transcript parts and the pointer fields for the video document"""
+        compressed = gzip.compress(transcript.encode('utf-8')) if transcript else b''
+        parts = [compressed[start:start + TRANSCRIPT_PART_BYTES] for start in range(0, len(compressed), TRANSCRIPT_PART_BYTES)]
+        
+        parts_ref = video_ref.collection(TRANSCRIPT_SUBCOLLECTION)
+        part_writes = [
+            (parts_ref.document(f"{index:03d}"), {'index': index, 'data': part}, False)
+            for index, part in enumerate(parts)
+        ]
+        return part_writes, {
+            'transcript_parts': len(parts),
+            'transcript_size': len(transcript or ''),
+            'transcript_compressed_size': len(compressed),
+            'transcript_encoding': TRANSCRIPT_ENCODING,
+            # Remove the inline transcript of videos saved by older versions
+            'transcript': firestore.DELETE_FIELD
+        }
 
+    @limited('firestore')
     def get_channel(self, channel_id):
         """Get a specific channel from Firestore"""
-        print(f"Buscando canal específico: {channel_id}")
+        log_item(logger, "Buscando canal específico", channel_id=channel_id)
         channel_ref = self.db.collection('channels').document(channel_id)
         doc = channel_ref.get()
+        metrics.increment('firestore.reads')
         return doc.to_dict() if doc.exists else None
 
-    def get_video(self, video_id):
-        """Get a specific video from Firestore"""
+    @limited('firestore')
+    def get_video(self, video_id, include_transcript=False):
+        """Get a specific video from Firestore
+        
+        Only the metadata fields are read unless include_transcript is set.
+        """
         video_ref = self.db.collection('videos').document(video_id)
-        doc = video_ref.get()
-        exists = doc.exists
-        print(f"Verificando vídeo {video_id}: {'Existe' if exists else 'Não existe'}")
-        return doc.to_dict() if exists else None
+        field_paths = VIDEO_METADATA_FIELDS + VIDEO_TRANSCRIPT_FIELDS if include_transcript else VIDEO_METADATA_FIELDS
+        doc = video_ref.get(field_paths=field_paths)
+        metrics.increment('firestore.reads')
+        if not doc.exists:
+            return None
+            
+        video_data = doc.to_dict()
+        if include_transcript:
+            video_data['id'] = doc.id
+            video_data['transcript'] = self._load_transcripts([video_data]).get(doc.id, '')
+        return video_data
+
+    @limited('firestore')
+    def get_transcripts(self, videos):
+        """
+        Get the transcripts of videos read with at least VIDEO_TRANSCRIPT_FIELDS.
+        All transcript parts are read in one batched call.
+        Returns a dict keyed by video ID.
+        """
+        return self._load_transcripts(videos)
+
+    def _load_transcripts(self, videos):
+        transcripts = {}
+        refs = []
+        for video in videos:
+            if video.get('transcript'):
+                # Saved before transcripts were moved out of the video document
+                transcripts[video['id']] = video['transcript']
+                continue
+            parts_ref = self.db.collection('videos').document(video['id']).collection(TRANSCRIPT_SUBCOLLECTION)
+            refs.extend(parts_ref.document(f"{index:03d}") for index in range(video.get('transcript_parts') or 0))
+            
+        parts = {}
+        if refs:
+            for doc in self._counted(self.db.get_all(refs)):
+                if doc.exists:
+                    # The video ID is the parent of the transcript subcollection
+                    video_id = doc.reference.path.split('/')[-3]
+                    parts.setdefault(video_id, {})[doc.id] = doc.to_dict()['data']
+                    
+        for video_id, video_parts in parts.items():
+            compressed = b''.join(video_parts[name] for name in sorted(video_parts))
+            transcripts[video_id] = gzip.decompress(compressed).decode('utf-8')
+        return transcripts
+
+    @limited('firestore')
+    def get_videos(self, video_ids, field_paths=None):
+        """
+        Get many videos in a single batched read.
+        Only the fields in field_paths are returned when given.
+        Returns a dict keyed by video ID with the videos that exist.
+        """
+        if not video_ids:
+            return {}
+            
+        videos_ref = self.db.collection('videos')
+        refs = [videos_ref.document(video_id) for video_id in video_ids]
+        
+        videos = {}
+        for doc in self._counted(self.db.get_all(refs, field_paths=field_paths)):
+            if doc.exists:
+                video_data = doc.to_dict()
+                video_data['id'] = doc.id
+                videos[doc.id] = video_data
+        return videos
+
+    @limited('firestore')
+    def get_channel_videos_since(self, channel_id, published_after, field_paths=None):
+        """
+        Get a channel's stored videos published after the given ISO 8601 timestamp.
+        Only the fields in field_paths are returned when given.
+        """
+        videos_ref = self.db.collection('videos')
+        query = (videos_ref
+                 .where(filter=firestore.FieldFilter('channel_id', '==', channel_id))
+                 .where(filter=firestore.FieldFilter('published_at', '>=', published_after)))
+        if field_paths:
+            query = query.select(field_paths)
+        
+        videos = []
+        for doc in self._counted(query.stream()):
+            video_data = doc.to_dict()
+            video_data['id'] = doc.id
+            videos.append(video_data)
+        return videos
 
+    @limited('firestore')
     def add_channel(self, channel_name, channel_url):
         """Add a new channel to Firestore with PENDING status"""
         channel_data = {
@@ -77,134 +259,289 @@ class FirebaseService:
             "platform": "Youtube"
         }
         
+        metrics.increment('firestore.writes')
         return self.db.collection('channels').add(channel_data)
 
+    @limited('firestore')
     def get_pending_channels(self):
         """Get all channels with PENDING status"""
-        print("Buscando canais pendentes do Firestore...")
+        logger.debug("Buscando canais pendentes do Firestore...")
         channels_ref = self.db.collection('channels')
         pending_channels = channels_ref.where(filter=firestore.FieldFilter('status', '==', 'PENDING')).stream()
         
         channels = []
-        for doc in pending_channels:
+        for doc in self._counted(pending_channels):
             channel_data = doc.to_dict()
             channel_data['doc_id'] = doc.id
             channels.append(channel_data)
         
-        print(f"Total de canais pendentes encontrados: {len(channels)}", channels)
+        logger.info("Total de canais pendentes encontrados: %d", len(channels))
         return channels
 
+    @limited('firestore')
     def get_active_channels(self):
         """Get all channels with ACTIVE status"""
-        print("Buscando canais ativos do Firestore...")
+        logger.debug("Buscando canais ativos do Firestore...")
         channels_ref = self.db.collection('channels')
         active_channels = channels_ref.where(filter=firestore.FieldFilter('status', '==', 'ACTIVE')).stream()
         
         channels = []
-        for doc in active_channels:
+        for doc in self._counted(active_channels):
             channel_data = doc.to_dict()
             channel_data['doc_id'] = doc.id
             channels.append(channel_data)
         
-        print(f"Total de canais ativos encontrados: {len(channels)}")
+        logger.info("Total de canais ativos encontrados: %d", len(channels))
         return channels
 
+    @limited('firestore')
     def update_channel_status(self, doc_id, update_data):
         """Update channel status and other fields"""
-        print(f"Atualizando canal {doc_id} com: {update_data}")
+        logger.debug("Atualizando canal %s com: %s", doc_id, update_data)
         channel_ref = self.db.collection('channels').document(doc_id)
         channel_ref.update(update_data)
+        metrics.increment('firestore.writes')
 
+    @limited('firestore')
     def get_latest_prompt(self):
         """Get the most recent prompt document from Firestore"""
-        print("Buscando prompt mais recente do Firestore...")
+        logger.debug("Buscando prompt mais recente do Firestore...")
         prompts_ref = self.db.collection('prompts')
         # Get the latest prompt ordered by timestamp
         latest_prompt = prompts_ref.order_by('created_at', direction=firestore.Query.DESCENDING).limit(1).stream()
         
         # Get the first (and only) document
-        for doc in latest_prompt:
+        for doc in self._counted(latest_prompt):
             return doc.to_dict()
         return None
 
-    def save_insight(self, insight_data):
+    def watch_latest_prompt(self, callback):
+        """
+        Call callback with the most recent prompt document (or None) now and
+        whenever it changes. Returns the Firestore watch; call unsubscribe()
+        on it to stop listening.
+        """
+        def on_snapshot(docs, changes, read_time):
+            metrics.increment('firestore.reads', max(1, len(changes)))
+            callback(docs[0].to_dict() if docs else None)
+
+        prompts_ref = self.db.collection('prompts')
+        query = prompts_ref.order_by('created_at', direction=firestore.Query.DESCENDING).limit(1)
+        return query.on_snapshot(on_snapshot)
+
+    def save_insight(self, insight_data, writer=None):
         """Save a new insight to Firestore"""
         if not insight_data.get('content'):
-            print(f"Ignorando insight vazio para: {insight_data.get('origin_id', 'Unknown')}")
+            logger.warning("Ignorando insight vazio para: %s", insight_data.get('origin_id', 'Unknown'))
             return
             
-        print(f"Salvando insight para: {insight_data.get('origin_id', 'Unknown')}")
+        log_item(logger, "Salvando insight para: %s", insight_data.get('origin_id', 'Unknown'), insight_type=insight_data.get('type'))
         insight_ref = self.db.collection('insights').document()
         insight_data['created_at'] = datetime.now()
-        insight_ref.set(insight_data)
+        self._set(insight_ref, insight_data, writer=writer)
 
+    @limited('firestore')
     def get_insight_by_origin(self, origin_id):
         """Get an insight by its origin_id"""
-        print(f"Verificando insight para origin_id: {origin_id}")
+        log_item(logger, "Verificando insight para origin_id: %s", origin_id)
         insights_ref = self.db.collection('insights')
         insights = insights_ref.where(filter=firestore.FieldFilter('origin_id', '==', origin_id)).limit(1).stream()
         
-        for doc in insights:
+        for doc in self._counted(insights):
+            return doc.to_dict()
+        return None
+
+    @limited('firestore')
+    def get_video_insights(self, video_ids):
+        """
+        Get the latest summary insight of each video.
+        Returns a dict keyed by video ID with the videos that have one.
+        """
+        insights_ref = self.db.collection('insights')
+        
+        insights = {}
+        # Firestore 'in' filters accept at most 30 values
+        for start in range(0, len(video_ids), 30):
+            query = (insights_ref
+                     .where(filter=firestore.FieldFilter('type', '==', 'video'))
+                     .where(filter=firestore.FieldFilter('origin_id', 'in', video_ids[start:start + 30]))
+                     .stream())
+            for doc in self._counted(query):
+                data = doc.to_dict()
+                previous = insights.get(data['origin_id'])
+                if previous and previous.get('created_at'):
+                    if not data.get('created_at') or data['created_at'] <= previous['created_at']:
+                        continue
+                insights[data['origin_id']] = data
+        return insights
+
+    @limited('firestore')
+    def get_latest_channel_summary(self, channel_id):
+        """Get the latest weekly summary insight of a channel"""
+        insights_ref = self.db.collection('insights')
+        query = (insights_ref
+                 .where(filter=firestore.FieldFilter('type', '==', 'channel'))
+                 .where(filter=firestore.FieldFilter('origin_id', '==', channel_id))
+                 .order_by('created_at', direction=firestore.Query.DESCENDING)
+                 .limit(1)
+                 .stream())
+                 
+        for doc in self._counted(query):
             return doc.to_dict()
         return None
 
+    @limited('firestore')
     def get_latest_master_summary(self):
         """Get the latest master summary from insights collection"""
         insights_ref = self.db.collection('insights')
         query = (insights_ref
                  .where(filter=firestore.FieldFilter('type', '==', 'consolidated_weekly'))
+                 .order_by('created_at', direction=firestore.Query.DESCENDING)
+                 .limit(1)
                  .stream())
                  
-        # Get all consolidated weekly summaries and find the most recent one
-        latest_summary = None
-        latest_timestamp = None
-        
-        for doc in query:
-            data = doc.to_dict()
-            if 'created_at' in data:
-                if not latest_timestamp or data['created_at'] > latest_timestamp:
-                    latest_timestamp = data['created_at']
-                    latest_summary = data
-        
-        return latest_summary
+        for doc in self._counted(query):
+            return doc.to_dict()
+        return None
 
+    @limited('firestore')
     def get_recent_channel_summaries(self, after_date):
         """Get channel summaries created after the specified date"""
         insights_ref = self.db.collection('insights')
         query = (insights_ref
                  .where(filter=firestore.FieldFilter('type', '==', 'channel'))
+                 .where(filter=firestore.FieldFilter('created_at', '>=', after_date))
                  .stream())
                  
         summaries = []
-        for doc in query:
+        for doc in self._counted(query):
             data = doc.to_dict()
-            # Filter by date in memory instead of in query
-            if 'created_at' in data and data['created_at'] >= after_date:
-                summaries.append({
-                    'channel_title': data.get('title', 'Unknown Channel'),
-                    'summary': data.get('content', '')
-                })
+            summaries.append({
+                'channel_id': data.get('origin_id'),
+                'channel_title': data.get('title', 'Unknown Channel'),
+                'summary': data.get('content', '')
+            })
         return summaries
 
+    @limited('firestore')
+    def get_cached_transcript(self, cache_key):
+        """Get a transcript cache entry"""
+        doc = self.db.collection('transcript_cache').document(cache_key).get()
+        metrics.increment('firestore.reads')
+        return doc.to_dict() if doc.exists else None
+
+    @limited('firestore')
+    def save_cached_transcript(self, cache_key, cache_data):
+        """Save a transcript cache entry"""
+        cache_ref = self.db.collection('transcript_cache').document(cache_key)
+        cache_data['created_at'] = datetime.now()
+        cache_ref.set(cache_data)
+        metrics.increment('firestore.writes')
+
+    @limited('firestore')
+    def get_checkpoint(self, name):
+        """Get the saved progress of a long-running job"""
+        doc = self.db.collection('checkpoints').document(name).get()
+        metrics.increment('firestore.reads')
+        return doc.to_dict() if doc.exists else None
+
+    @limited('firestore')
+    def save_checkpoint(self, name, checkpoint_data):
+        """Save the progress of a long-running job so it can be resumed"""
+        checkpoint_ref = self.db.collection('checkpoints').document(name)
+        checkpoint_data['updated_at'] = datetime.now()
+        checkpoint_ref.set(checkpoint_data)
+        metrics.increment('firestore.writes')
+
+    @limited('firestore')
+    def delete_checkpoint(self, name):
+        """Remove the checkpoint of a finished job"""
+        self.db.collection('checkpoints').document(name).delete()
+        metrics.increment('firestore.writes')
+
+    @limited('firestore')
+    def save_run_report(self, report):
+        """Save the stage timings and quota counters of a pipeline run"""
+        self.db.collection('runs').add(report)
+        metrics.increment('firestore.writes')
+
+    @limited('firestore')
+    def save_summary_batch(self, batch_data):
+        """Save a submitted Message Batch so its results can be collected later"""
+        batch_ref = self.db.collection('summary_batches').document(batch_data['batch_id'])
+        batch_data['status'] = 'PENDING'
+        batch_data['created_at'] = datetime.now()
+        batch_ref.set(batch_data)
+        metrics.increment('firestore.writes')
+
+    @limited('firestore')
+    def get_pending_summary_batches(self):
+        """Get all Message Batches whose results were not collected yet"""
+        batches_ref = self.db.collection('summary_batches')
+        query = batches_ref.where(filter=firestore.FieldFilter('status', '==', 'PENDING')).stream()
+        return [doc.to_dict() for doc in self._counted(query)]
+
+    @limited('firestore')
+    def complete_summary_batch(self, batch_id):
+        """Mark a Message Batch as collected"""
+        batch_ref = self.db.collection('summary_batches').document(batch_id)
+        batch_ref.update({
+            'status': 'DONE',
+            'completed_at': datetime.now()
+        })
+        metrics.increment('firestore.writes')
+
+    @limited('firestore')
+    def get_custom_summary(self, summary_key):
+        """Get a custom summary previously generated with the same inputs"""
+        doc = self.db.collection('custom_summaries').document(summary_key).get()
+        metrics.increment('firestore.reads')
+        return doc.to_dict() if doc.exists else None
+
+    @limited('firestore')
+    def save_custom_summary(self, summary_key, summary_data):
+        """Save a custom summary under its summary_key"""
+        summary_ref = self.db.collection('custom_summaries').document(summary_key)
+        summary_data['created_at'] = datetime.now()
+        summary_ref.set(summary_data)
+        metrics.increment('firestore.writes')
+
+    @limited('firestore')
+    def get_group_summary(self, summary_key):
+        """Get a cached master summary group result"""
+        doc = self.db.collection('group_summaries').document(summary_key).get()
+        metrics.increment('firestore.reads')
+        return doc.to_dict() if doc.exists else None
+
+    @limited('firestore')
+    def save_group_summary(self, summary_key, summary_data):
+        """Cache a master summary group result under its summary_key"""
+        summary_ref = self.db.collection('group_summaries').document(summary_key)
+        summary_data['created_at'] = datetime.now()
+        summary_ref.set(summary_data)
+        metrics.increment('firestore.writes')
+
+    @limited('firestore')
     def get_youtube_transcript_token(self):
         """Get the YouTube transcript bearer token from Firestore"""
-        print("Buscando token de transcrição do YouTube...")
+        logger.debug("Buscando token de transcrição do YouTube...")
         token_ref = self.db.collection('tokens').limit(1).stream()
-        for doc in token_ref:
+        for doc in self._counted(token_ref):
             return doc.to_dict().get('token')
         return None
         
+    @limited('firestore')
     def get_channels_last_updated(self):
         """
         Get the last_updated field for all channels in Firestore
         Returns a list of channels with their update status
         """
-        print("Buscando datas de atualização de todos os canais...")
+        logger.debug("Buscando datas de atualização de todos os canais...")
         channels_ref = self.db.collection('channels')
-        docs = channels_ref.stream()
+        docs = channels_ref.select(['title', 'status', 'updated_at', 'created_at']).stream()
         
         channels_data = []
-        for doc in docs:
+        for doc in self._counted(docs):
             doc_data = doc.to_dict()
             # Check for updated_at or created_at field
             last_updated = doc_data.get('updated_at', doc_data.get('created_at'))
@@ -229,67 +566,118 @@ class FirebaseService:
             
         return channels_data
         
-    def get_videos_last_updated(self):
+    def iter_videos_last_updated(self, channel_id=None, since=None, max_results=None, page_size=LISTING_PAGE_SIZE):
         """
-        Get the last_updated field for all videos in Firestore
-        Returns a list of videos with their update information
+        Yield videos with their update information, most recently updated first.
+        
+        Firestore does the ordering and only the listed fields are read. Pages
+        of page_size documents are fetched with a cursor, so rows are yielded
+        as they arrive and memory does not grow with the number of videos.
+        Optionally filters by channel_id and by videos updated at or after since,
+        and stops after max_results videos.
         """
-        print("Buscando datas de atualização de todos os vídeos...")
-        videos_ref = self.db.collection('videos')
-        docs = videos_ref.stream()
+        logger.debug("Buscando datas de atualização dos vídeos...")
+        query = self.db.collection('videos')
+        if channel_id:
+            query = query.where(filter=firestore.FieldFilter('channel_id', '==', channel_id))
+        if since:
+            query = query.where(filter=firestore.FieldFilter('updated_at', '>=', since))
+        query = (query
+                 .order_by('updated_at', direction=firestore.Query.DESCENDING)
+                 .select(['title', 'channel_id', 'published_at', 'updated_at']))
         
-        videos_data = []
-        for doc in docs:
-            doc_data = doc.to_dict()
-            # Check for updated_at or created_at field
-            last_updated = doc_data.get('updated_at', doc_data.get('created_at'))
-            
-            # Get video data
-            title = doc_data.get('title', 'No Title')
-            channel_id = doc_data.get('channel_id', 'Unknown Channel')
-            published_at = doc_data.get('published_at')
-            
-            if last_updated:
-                videos_data.append({
+        remaining = max_results
+        last_doc = None
+        while remaining is None or remaining > 0:
+            page_limit = page_size if remaining is None else min(page_size, remaining)
+            page_query = query.limit(page_limit)
+            if last_doc:
+                page_query = page_query.start_after(last_doc)
+            with limit('firestore'):
+                docs = list(page_query.stream())
+                
+            for doc in self._counted(docs):
+                doc_data = doc.to_dict()
+                yield {
                     'id': doc.id,
-                    'title': title,
-                    'channel_id': channel_id,
-                    'published_at': published_at,
-                    'last_updated': last_updated
-                })
-        
-        # Sort by last_updated, newest first
-        if videos_data:
-            videos_data.sort(key=lambda x: x['last_updated'], reverse=True)
-            
-        return videos_data
+                    'title': doc_data.get('title', 'No Title'),
+                    'channel_id': doc_data.get('channel_id', 'Unknown Channel'),
+                    'published_at': doc_data.get('published_at'),
+                    'last_updated': doc_data['updated_at']
+                }
+                
+            if len(docs) < page_limit:
+                return
+            last_doc = docs[-1]
+            if remaining is not None:
+                remaining -= len(docs)
 
+    @limited('firestore')
     def get_videos_without_transcript(self):
         """
         Get all videos that don't have transcripts yet
-        Returns a list of videos that have has_transcript=False or don't have the field
+        Returns a list of videos that have has_transcript=False
+        
+        Every video is saved with has_transcript, so a single equality query is
+        enough. Older documents without the field can be fixed once with
+        backfill_has_transcript().
         """
-        print("Buscando vídeos sem transcrição...")
+        logger.debug("Buscando vídeos sem transcrição...")
         videos_ref = self.db.collection('videos')
         
-        # Get videos where has_transcript is False or field doesn't exist
         query = videos_ref.where(
             filter=firestore.FieldFilter('has_transcript', '==', False)
-        ).stream()
+        ).select(['title', 'channel_id', 'published_at', 'has_transcript']).stream()
         
         videos = []
-        for doc in query:
+        for doc in self._counted(query):
             video_data = doc.to_dict()
             video_data['id'] = doc.id
             videos.append(video_data)
-            
-        # Also get videos where has_transcript field doesn't exist
-        all_videos = videos_ref.stream()
-        for doc in all_videos:
-            video_data = doc.to_dict()
-            if 'has_transcript' not in video_data:
-                video_data['id'] = doc.id
-                videos.append(video_data)
         
-        print(f"Total de vídeos sem transcrição: {len(videos)}")
-        return videos
\ No newline at end of file
+        logger.info("Total de vídeos sem transcrição: %d", len(videos))
+        return videos
+
+    def backfill_has_transcript(self):
+        """
+        Set has_transcript on videos saved before the field was always written.
+        Scans the videos collection once, reading only the fields it needs.
+        Returns the number of updated videos.
+        """
+        logger.info("Preenchendo has_transcript nos vídeos antigos...")
+        videos_ref = self.db.collection('videos')
+        
+        updated = 0
+        with self.batch_writer() as writer:
+            with limit('firestore'):
+                docs = list(videos_ref.select(['has_transcript', 'transcript']).stream())
+            for doc in self._counted(docs):
+                video_data = doc.to_dict()
+                if 'has_transcript' not in video_data:
+                    writer.update(doc.reference, {'has_transcript': bool(video_data.get('transcript'))})
+                    updated += 1
+                    
+        logger.info("Total de vídeos atualizados: %d", updated)
+        return updated
+
+    def migrate_inline_transcripts(self):
+        """
+        Move transcripts stored inline in video documents by older versions to
+        the transcript subcollection. Returns the number of migrated videos.
+        """
+        logger.info("Movendo transcrições dos documentos de vídeo para a subcoleção...")
+        videos_ref = self.db.collection('videos')
+        
+        migrated = 0
+        with self.batch_writer() as writer:
+            with limit('firestore'):
+                docs = list(videos_ref.where(
+                    filter=firestore.FieldFilter('transcript', '>', '')
+                ).select(['transcript']).stream())
+            for doc in self._counted(docs):
+                part_writes, pointer = self._transcript_writes(doc.reference, doc.to_dict()['transcript'])
+                self._set_group(part_writes + [(doc.reference, pointer, True)], writer=writer)
+                migrated += 1
+                
+        logger.info("Total de vídeos migrados: %d", migrated)
+        return migrated
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from config import YOUTUBE_HTTP_CACHE_PATH, YOUTUBE_HTTP_CACHE_MAX_AGE_HOURS
+from metrics import metrics
+from log import get_logger
+
+logger = get_logger('http_cache')
+
+# Response headers kept with a cached body and returned when it is served again
+CACHED_HEADERS = ('content-type', 'etag')
+
+class ETagCache:
+    """
+    Local SQLite store of API response bodies keyed by request URI, along
+    with the ETag the server sent for them.
+
+    Entries are only used to answer conditional requests, so they can't go
+    stale: the server is always asked whether the body changed. Entries not
+    stored again within YOUTUBE_HTTP_CACHE_MAX_AGE_HOURS are dropped when the
+    cache is opened.
+    """
+
+    def __init__(self, path=YOUTUBE_HTTP_CACHE_PATH, max_age_hours=YOUTUBE_HTTP_CACHE_MAX_AGE_HOURS):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    etag TEXT NOT NULL,
+                    headers TEXT NOT NULL,
+                    content BLOB NOT NULL,
+                    stored_at REAL NOT NULL
+                )"""
+            )
+            self._db.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - max_age_hours * 3600,))
+            self._db.commit()
+
+    @staticmethod
+    def cache_key(uri):
+        """The URI includes the API key, so only its hash is stored"""
+        return hashlib.sha256(uri.encode('utf-8')).hexdigest()
+
+    def get(self, uri):
+        """Get the cached (etag, headers, content) of a URI, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, headers, content FROM responses WHERE key = ?",
+                (self.cache_key(uri),)
+            ).fetchone()
+        if not row:
+            return None
+        etag, headers, content = row
+        return etag, json.loads(headers), zlib.decompress(content)
+
+    def set(self, uri, etag, headers, content):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, etag, headers, content, stored_at) VALUES (?, ?, ?, ?, ?)",
+                (self.cache_key(uri), etag, json.dumps(headers), zlib.compress(content), time.time())
+            )
+            self._db.commit()
+
+class ConditionalHttp:
+    """
+    HTTP transport for googleapiclient that revalidates cached responses.
+
+    Wraps an httplib2.Http (or compatible) object. GET requests for a URI with
+    a cached response are sent with If-None-Match; when the server answers
+    304 Not Modified the cached body is returned as a 200, so googleapiclient
+    never sees the difference and no payload is transferred. Every other
+    attribute is delegated to the wrapped transport.
+    """
+
+    def __init__(self, http, cache):
+        self.http = http
+        self.cache = cache
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        if method != 'GET':
+            return self.http.request(uri, method=method, body=body, headers=headers, **kwargs)
+
+        headers = dict(headers or {})
+        cached = self.cache.get(uri)
+        if cached:
+            headers['if-none-match'] = cached[0]
+        response, content = self.http.request(uri, method=method, body=body, headers=headers, **kwargs)
+
+        if response.status == 304 and cached:
+            import httplib2
+            etag, cached_headers, cached_content = cached
+            metrics.increment('youtube.http_cache.not_modified')
+            metrics.increment('youtube.http_cache.bytes_saved', len(cached_content))
+            cached_response = httplib2.Response({**cached_headers, 'status': '200'})
+            cached_response.fromcache = True
+            return cached_response, cached_content
+
+        if response.status == 200 and response.get('etag'):
+            metrics.increment('youtube.http_cache.stored')
+            try:
+                self.cache.set(uri, response['etag'], {name: response[name] for name in CACHED_HEADERS if name in response}, content)
+            except sqlite3.Error as e:
+                logger.warning("Erro ao salvar resposta em cache: %s", e)
+        return response, content
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
@@ -0,0 +1,77 @@
+import itertools
+import json
+import logging
+import sys
+import threading
+from datetime import datetime, timezone
+from config import LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_EVERY
+
+# Attributes every LogRecord has; anything else was passed through extra= and
+# is emitted as a structured field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, the format Cloud Logging parses into severity,
+    message and searchable jsonPayload fields (channel_id, video_id, stage...).
+    """
+
+    def format(self, record):
+        entry = {
+            'severity': record.levelname,
+            'message': record.getMessage(),
+            'logger': record.name,
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Human readable lines for local runs, with the structured fields appended"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = [f"{key}={value}" for key, value in record.__dict__.items()
+                  if key not in _RECORD_ATTRIBUTES and not key.startswith('_')]
+        return f"{line} [{' '.join(fields)}]" if fields else line
+
+_root = logging.getLogger('pipeline')
+_root.setLevel(LOG_LEVEL)
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter())
+_root.addHandler(_handler)
+_root.propagate = False
+
+def get_logger(name):
+    """Logger for a pipeline module, e.g. get_logger('scraper')"""
+    return _root.getChild(name)
+
+_sample_counters = {}
+_sample_lock = threading.Lock()
+
+def log_item(logger, msg, *args, **fields):
+    """
+    Log a per-item message (one per video, document or request).
+
+    With DEBUG enabled every message is logged. At INFO only one in every
+    LOG_SAMPLE_EVERY messages with the same template is logged, so the log
+    volume does not grow with the number of videos.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(msg, *args, extra=fields)
+        return
+    if not logger.isEnabledFor(logging.INFO):
+        return
+
+    with _sample_lock:
+        counter = _sample_counters.setdefault((logger.name, msg), itertools.count())
+        position = next(counter)
+    if position % LOG_SAMPLE_EVERY == 0:
+        logger.info(msg, *args, extra={**fields, 'sampled': True, 'sample_every': LOG_SAMPLE_EVERY})
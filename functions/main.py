@@ -1,18 +1,17 @@
 from firebase_admin import initialize_app
 from firebase_functions import https_fn, firestore_fn, scheduler_fn
-from flask import jsonify, request
-from scraper import main
-from firebase_service import FirebaseService
-from claude_service import ClaudeService
+from flask import Response, jsonify, request, stream_with_context
+from services import get_firebase_service, get_claude_service
+import json
 
-# Initialize services
-firebase_service = FirebaseService()
-claude_service = ClaudeService(firebase_service)
+# Services are built on first use and scraper is imported only by run_full_process,
+# so cold starts of the custom summary endpoints don't load the whole pipeline
 
 @https_fn.on_request()
 def run_full_process(req: https_fn.Request) -> None:
     """Cloud Function to manually trigger the full processing flow."""
     try:
+        from scraper import main
         main()
         return jsonify({
             'status': 'success',
@@ -24,36 +23,91 @@ def run_full_process(req: https_fn.Request) -> None:
             'message': str(e)
         }), 500
 
+@firestore_fn.on_document_created(document="work_queue/{task_id}", timeout_sec=540)
+def process_work_task(event: firestore_fn.Event[firestore_fn.DocumentSnapshot | None]) -> None:
+    """Worker started for each channel task enqueued by a fan-out run (PROCESS_MODE=fanout)."""
+    if event.data is None:
+        return
+    from scraper import run_work_task
+    run_work_task(event.data.get('run_id'), event.params['task_id'])
+
+@https_fn.on_request(timeout_sec=540)
+def process_work_queue(req: https_fn.Request) -> None:
+    """Retry the tasks of a fan-out run that failed or whose workers stopped."""
+    try:
+        from scraper import current_run_id, run_work_task
+        run_id = req.args.get('run_id') or current_run_id()
+        run_work_task(run_id)
+        return jsonify({
+            'status': 'success',
+            'message': f'Work queue of run {run_id} processed'
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+def _get_custom_summary_video(data):
+    """
+    Validate a custom summary request and load its video.
+    Returns the video data and None, or None and the error response.
+    """
+    video_id = data.get('video_id')
+    custom_prompt = data.get('prompt')
+
+    # Validate input
+    if not video_id or not custom_prompt:
+        return None, (jsonify({
+            'status': 'error',
+            'message': 'Both video_id and prompt are required'
+        }), 400)
+
+    # Get video data from Firebase
+    video_data = get_firebase_service().get_video(video_id, include_transcript=True)
+    if not video_data:
+        return None, (jsonify({
+            'status': 'error',
+            'message': 'Video not found'
+        }), 404)
+
+    # Check if video has transcript
+    if not video_data.get('transcript'):
+        return None, (jsonify({
+            'status': 'error',
+            'message': 'Video has no transcript available'
+        }), 400)
+
+    return video_data, None
+
 @https_fn.on_request(timeout_sec=540)
 def generate_custom_summary(req: https_fn.Request) -> None:
     """Generate a custom summary for a video using a provided prompt."""
     try:
+        firebase_service = get_firebase_service()
+        claude_service = get_claude_service()
+
         # Get request data
         data = req.get_json()
         video_id = data.get('video_id')
         custom_prompt = data.get('prompt')
 
-        # Validate input
-        if not video_id or not custom_prompt:
-            return jsonify({
-                'status': 'error',
-                'message': 'Both video_id and prompt are required'
-            }), 400
-
-        # Get video data from Firebase
-        video_data = firebase_service.get_video(video_id)
-        if not video_data:
-            return jsonify({
-                'status': 'error',
-                'message': 'Video not found'
-            }), 404
+        video_data, error_response = _get_custom_summary_video(data)
+        if error_response:
+            return error_response
 
-        # Check if video has transcript
-        if not video_data.get('transcript'):
+        # Return the stored summary when the same video and prompt were already summarized
+        summary_key = claude_service.video_summary_key(video_data['transcript'], video_data['title'], custom_prompt)
+        cached_summary = firebase_service.get_custom_summary(summary_key)
+        if cached_summary:
             return jsonify({
-                'status': 'error',
-                'message': 'Video has no transcript available'
-            }), 400
+                'status': 'success',
+                'video_id': video_id,
+                'title': video_data['title'],
+                'summary': cached_summary['summary'],
+                'has_summary': True,
+                'cached': True
+            })
 
         # Generate summary using custom prompt
         summary_result = claude_service.summarize_transcript(
@@ -62,12 +116,19 @@ def generate_custom_summary(req: https_fn.Request) -> None:
             custom_prompt
         )
 
+        if summary_result['has_summary']:
+            firebase_service.save_custom_summary(summary_key, {
+                'video_id': video_id,
+                'summary': summary_result['summary']
+            })
+
         return jsonify({
             'status': 'success',
             'video_id': video_id,
             'title': video_data['title'],
             'summary': summary_result['summary'],
-            'has_summary': summary_result['has_summary']
+            'has_summary': summary_result['has_summary'],
+            'cached': False
         })
 
     except Exception as e:
@@ -76,6 +137,71 @@ def generate_custom_summary(req: https_fn.Request) -> None:
             'message': str(e)
         }), 500
 
+def _sse_event(event, data):
+    """Format a server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@https_fn.on_request(timeout_sec=540)
+def generate_custom_summary_stream(req: https_fn.Request) -> None:
+    """
+    Generate a custom summary for a video, streamed as server-sent events.
+    
+    Sends 'text' events with the summary as it is generated and a final 'done'
+    event (or 'error'). A summary already generated for the same video and
+    prompt is sent at once in a single 'text' event.
+    """
+    try:
+        firebase_service = get_firebase_service()
+        claude_service = get_claude_service()
+
+        data = req.get_json()
+        video_id = data.get('video_id')
+        custom_prompt = data.get('prompt')
+
+        video_data, error_response = _get_custom_summary_video(data)
+        if error_response:
+            return error_response
+
+        summary_key = claude_service.video_summary_key(video_data['transcript'], video_data['title'], custom_prompt)
+        cached_summary = firebase_service.get_custom_summary(summary_key)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+    def generate():
+        if cached_summary:
+            yield _sse_event('text', {'text': cached_summary['summary']})
+            yield _sse_event('done', {'video_id': video_id, 'title': video_data['title'], 'cached': True})
+            return
+
+        try:
+            summary_parts = []
+            for text in claude_service.stream_transcript_summary(
+                video_data['transcript'],
+                video_data['title'],
+                custom_prompt
+            ):
+                summary_parts.append(text)
+                yield _sse_event('text', {'text': text})
+
+            summary = ''.join(summary_parts)
+            if summary:
+                firebase_service.save_custom_summary(summary_key, {
+                    'video_id': video_id,
+                    'summary': summary
+                })
+            yield _sse_event('done', {'video_id': video_id, 'title': video_data['title'], 'cached': False})
+        except Exception as e:
+            yield _sse_event('error', {'message': str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache'}
+    )
+
 # @scheduler_fn.on_schedule(schedule="every day 00:00")
 # def daily_process_channels(event: scheduler_fn.ScheduledEvent) -> None:
 #     """Cloud Function that runs weekly to process all channels."""
@@ -0,0 +1,120 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+
+class Metrics:
+    """
+    Thread-safe registry of stage latencies and counters for one pipeline run.
+
+    Stages are timed with timer() or the timed() decorator; counters track
+    external usage such as YouTube quota units, Firestore reads and writes
+    and Anthropic tokens.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Start a new run"""
+        with self._lock:
+            self._latencies = {}
+            self._counters = {}
+            self._started_at = datetime.now(timezone.utc)
+
+    @contextmanager
+    def timer(self, stage):
+        """Record how long the block takes under the given stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        """Record one latency sample"""
+        with self._lock:
+            self._latencies.setdefault(stage, []).append(seconds)
+
+    def increment(self, counter, value=1):
+        """Add value to a counter"""
+        if not value:
+            return
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def report(self):
+        """Structured summary of the run: latency statistics per stage and all counters"""
+        with self._lock:
+            latencies = {stage: sorted(samples) for stage, samples in self._latencies.items()}
+            counters = dict(self._counters)
+            started_at = self._started_at
+            
+        stages = {}
+        for stage, samples in latencies.items():
+            stages[stage] = {
+                'count': len(samples),
+                'total_seconds': round(sum(samples), 4),
+                'p50_seconds': round(_percentile(samples, 0.50), 4),
+                'p95_seconds': round(_percentile(samples, 0.95), 4),
+                'max_seconds': round(samples[-1], 4),
+                'buckets': {str(bound): sum(1 for sample in samples if sample <= bound) for bound in LATENCY_BUCKETS}
+            }
+            
+        finished_at = datetime.now(timezone.utc)
+        return {
+            'started_at': started_at.isoformat(),
+            'finished_at': finished_at.isoformat(),
+            'duration_seconds': round((finished_at - started_at).total_seconds(), 3),
+            'stages': stages,
+            'counters': counters
+        }
+
+    def to_openmetrics(self):
+        """Render the run metrics in the OpenMetrics text format"""
+        with self._lock:
+            latencies = {stage: list(samples) for stage, samples in self._latencies.items()}
+            counters = dict(self._counters)
+            
+        lines = [
+            '# TYPE pipeline_stage_seconds histogram',
+            '# UNIT pipeline_stage_seconds seconds'
+        ]
+        for stage, samples in sorted(latencies.items()):
+            for bound in LATENCY_BUCKETS:
+                count = sum(1 for sample in samples if sample <= bound)
+                lines.append(f'pipeline_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'pipeline_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {len(samples)}')
+            lines.append(f'pipeline_stage_seconds_count{{stage="{stage}"}} {len(samples)}')
+            lines.append(f'pipeline_stage_seconds_sum{{stage="{stage}"}} {sum(samples)}')
+            
+        for counter, value in sorted(counters.items()):
+            name = 'pipeline_' + re.sub(r'[^a-zA-Z0-9_]', '_', counter)
+            lines.append(f'# TYPE {name} counter')
+            lines.append(f'{name}_total {value}')
+            
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+def _percentile(sorted_samples, fraction):
+    index = min(len(sorted_samples) - 1, int(round(fraction * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+# Process-wide registry shared by all services
+metrics = Metrics()
+
+def timed(stage):
+    """Decorator that records the duration of every call under the given stage"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
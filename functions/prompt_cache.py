@@ -0,0 +1,104 @@
+import re
+import threading
+import time
+from config import PROMPT_CACHE_TTL_SECONDS, PROMPT_CACHE_WATCH
+
+# Parameters that can be used in the prompt templates stored in Firestore
+PROMPT_PARAMETERS = ['VIDEO_TITLE', 'CHANNEL_NAME']
+_PARAMETER_PATTERN = re.compile('%(' + '|'.join(PROMPT_PARAMETERS) + ')')
+
+class CompiledPrompt:
+    """Prompt template split once into literal text and %PARAMETER parts"""
+
+    def __init__(self, template):
+        self.template = template
+        # re.split with a capture group alternates literal text and parameter names
+        self._parts = _PARAMETER_PATTERN.split(template)
+
+    @property
+    def parameters(self):
+        """Names of the parameters used in the template, in order of first use"""
+        return list(dict.fromkeys(self._parts[1::2]))
+
+    def render(self, **values):
+        """
+        Fill the template parameters, e.g. render(VIDEO_TITLE='...').
+        Parameters without a value are left in the text unchanged.
+        """
+        rendered = []
+        for index, part in enumerate(self._parts):
+            if index % 2 == 0:
+                rendered.append(part)
+            else:
+                rendered.append(values.get(part) or f"%{part}")
+        return ''.join(rendered)
+
+    def render_cacheable(self, **values):
+        """
+        Render the template for prompt caching: the template text is kept as
+        is, so it is identical on every call and can be cached, and the values
+        of its parameters follow it as '%PARAMETER: value' lines.
+        """
+        lines = [f"%{name}: {values[name]}" for name in self.parameters if values.get(name)]
+        return "\n".join([self.template, *lines])
+
+class PromptCache:
+    """
+    Caches the latest prompts document and its compiled templates.
+
+    The document is read from Firestore again once ttl_seconds have passed.
+    When watch is enabled a Firestore snapshot listener pushes new versions
+    and the TTL is not used.
+    """
+
+    def __init__(self, firebase_service, ttl_seconds=PROMPT_CACHE_TTL_SECONDS, watch=PROMPT_CACHE_WATCH):
+        self.firebase_service = firebase_service
+        self.ttl_seconds = ttl_seconds
+        self._prompts = None
+        self._compiled = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._watch = None
+        if watch:
+            self._watch = firebase_service.watch_latest_prompt(self._set_prompts)
+
+    def get(self):
+        """Get the latest prompts document"""
+        with self._lock:
+            if self._is_fresh():
+                return self._prompts
+                
+        prompts = self.firebase_service.get_latest_prompt()
+        self._set_prompts(prompts)
+        return prompts
+
+    def get_template(self, name):
+        """Get a compiled prompt template, or None if the latest prompts document lacks it"""
+        prompts = self.get()
+        if not prompts or name not in prompts:
+            return None
+            
+        with self._lock:
+            compiled = self._compiled.get(name)
+            if compiled is None or compiled.template != prompts[name]:
+                compiled = CompiledPrompt(prompts[name])
+                self._compiled[name] = compiled
+            return compiled
+
+    def invalidate(self):
+        """Force the next lookup to read Firestore"""
+        with self._lock:
+            self._loaded_at = None
+
+    def _is_fresh(self):
+        if self._loaded_at is None:
+            return False
+        if self._watch is not None:
+            return True
+        return time.monotonic() - self._loaded_at < self.ttl_seconds
+
+    def _set_prompts(self, prompts):
+        with self._lock:
+            self._prompts = prompts
+            self._compiled = {}
+            self._loaded_at = time.monotonic()
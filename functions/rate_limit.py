@@ -0,0 +1,51 @@
+import random
+import threading
+import time
+from log import get_logger
+
+logger = get_logger('rate_limit')
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+    Allows bursts of up to capacity calls and a sustained rate of rate calls per second.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+def retry_with_backoff(func, retry_on, max_retries, base_delay, max_delay):
+    """
+    Call func, retrying on the given exceptions with jittered exponential backoff.
+    The delay before retry n is a random value between 0 and min(max_delay, base_delay * 2 ** n).
+    The last exception is raised once max_retries is exhausted.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except retry_on as e:
+            if attempt >= max_retries:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            logger.warning("Limite de requisições atingido (%s), tentando novamente em %.1fs", type(e).__name__, delay)
+            time.sleep(delay)
+            attempt += 1
@@ -17,34 +17,91 @@ Program Rules and Requirements
 
 4. Update Frequency:
    - Channels are only updated if not processed in the last 24 hours
+   - Channels without new uploads since their last complete run reuse their stored weekly summary
    - Master summary is only generated if none exists for the last 7 days
 """
 
-from firebase_service import FirebaseService
-from youtube_service import YouTubeService
 from cli import handle_cli_commands
+import os
+import socket
+import threading
 import time
-from claude_service import ClaudeService
+from concurrency import run_concurrently
+from services import get_firebase_service, get_youtube_service, get_claude_service, get_work_queue
+from firebase_service import VIDEO_TRANSCRIPT_FIELDS
+from metrics import metrics
+from log import get_logger, log_item
+from config import (
+    CHANNEL_WORKERS,
+    CHANNEL_SUMMARY_MODE,
+    TRANSCRIPT_CONCURRENCY,
+    SUMMARY_MODE,
+    SUMMARY_BATCH_WAIT_SECONDS,
+    SUMMARY_BATCH_POLL_SECONDS,
+    METRICS_OPENMETRICS_PATH,
+    SKIP_UNCHANGED_CHANNELS,
+    PROCESS_MODE
+)
 from datetime import datetime, timedelta, timezone
 
-# Initialize global service instances
-firebase_service = FirebaseService()
-youtube_service = YouTubeService(firebase_service)
-claude_service = ClaudeService(firebase_service)
+logger = get_logger('scraper')
+
+# Shared service instances; main.py imports this module only when a run starts
+firebase_service = get_firebase_service()
+youtube_service = get_youtube_service()
+claude_service = get_claude_service()
+
+# Checkpoint document used to resume process_missing_transcripts
+TRANSCRIPTS_CHECKPOINT = 'process_missing_transcripts'
+TRANSCRIPTS_CHECKPOINT_INTERVAL = 50
+
+# Video fields read by process_single_channel; transcripts are loaded separately
+# and only for videos that have one
+VIDEO_PIPELINE_FIELDS = ['title', 'channel_id', 'published_at', 'has_transcript', *VIDEO_TRANSCRIPT_FIELDS]
+
+def channel_unchanged(channel, latest_video_id, seven_days_ago):
+    """
+    True when a full run of the channel would produce the same result as its
+    last complete run: no new upload, no recent video still waiting for a
+    transcript and no recent video leaving the 7-day window.
+    
+    The fields checked are written by process_single_channel; channels that
+    were never processed completely don't have them and are always processed.
+    """
+    if not SKIP_UNCHANGED_CHANNELS or not latest_video_id:
+        return False
+    if latest_video_id != channel.get('latest_video_id'):
+        return False
+    if channel.get('videos_without_transcript', 1) != 0 or 'oldest_recent_video_at' not in channel:
+        return False
+    oldest_recent_video_at = channel['oldest_recent_video_at']
+    return oldest_recent_video_at is None or oldest_recent_video_at >= seven_days_ago
+
+def stored_channel_summary(channel):
+    """The weekly summary saved by the channel's last complete run, if still within the last 7 days"""
+    if channel['oldest_recent_video_at'] is None:
+        return None
+    summary = firebase_service.get_latest_channel_summary(channel['channel_id'])
+    if not summary or time.time() - summary['created_at'].timestamp() > 7 * 86400:
+        return None
+    return {
+        'channel_id': channel['channel_id'],
+        'channel_title': summary['title'],
+        'summary': summary['content']
+    }
 
 def process_pending_channels():
     """Process channels with PENDING status to get their channel IDs"""
-    print("\nVerificando canais pendentes...")
+    logger.info("Verificando canais pendentes...")
     pending_channels = firebase_service.get_pending_channels()
-    print("pending_channels", pending_channels)
     
     for channel in pending_channels:
-        print(f"\nProcessando canal pendente: {channel['title']}")
+        logger.info("Processando canal pendente: %s", channel['title'])
         try:
             channel_id = youtube_service.extract_channel_id_from_url(channel['url'])
             
             if channel_id:
-                print(f"ID do canal encontrado: {channel_id}")
+                logger.info("ID do canal encontrado", extra={'channel_id': channel_id})
                 # Update the channel document with the ID and change status to ACTIVE
                 firebase_service.update_channel_status(
                     channel['doc_id'],
@@ -54,34 +111,47 @@ def process_pending_channels():
                     }
                 )
             else:
-                print(f"❌ Não foi possível encontrar o ID para o canal: {channel['name']}")
+                logger.error("Não foi possível encontrar o ID para o canal: %s", channel['name'])
                 
         except Exception as e:
-            print(f"❌ Erro ao processar canal pendente {channel['name']}: {str(e)}")
+            logger.exception("Erro ao processar canal pendente %s: %s", channel['name'], e)
             continue
 
 def process_missing_transcripts():
     """
     Process all videos that don't have transcripts yet.
     Fetches transcripts using YouTube API and saves them to Firestore.
+    
+    Videos are processed by a pool of TRANSCRIPT_CONCURRENCY workers paced by
+    the transcript rate limiter. Progress is checkpointed in Firestore, so an
+    interrupted run resumes without fetching the same videos again.
     """
-    print("\n=== Processando vídeos sem transcrição ===")
+    logger.info("Processando vídeos sem transcrição", extra={'stage': 'transcripts'})
     
     # Get all videos without transcripts
     videos = firebase_service.get_videos_without_transcript()
     
+    # Skip videos already handled by an interrupted previous run
+    checkpoint = firebase_service.get_checkpoint(TRANSCRIPTS_CHECKPOINT) or {}
+    processed_ids = set(checkpoint.get('processed_ids', []))
+    if processed_ids:
+        logger.info("Retomando processamento: %d vídeos já processados", len(processed_ids), extra={'stage': 'transcripts'})
+        videos = [video for video in videos if video['id'] not in processed_ids]
+    
     if not videos:
-        print("Nenhum vídeo encontrado sem transcrição.")
+        logger.info("Nenhum vídeo encontrado sem transcrição.", extra={'stage': 'transcripts'})
+        firebase_service.delete_checkpoint(TRANSCRIPTS_CHECKPOINT)
         return
         
-    print(f"Encontrados {len(videos)} vídeos para processar")
+    logger.info("Encontrados %d vídeos para processar", len(videos), extra={'stage': 'transcripts'})
     
-    for video in videos:
+    checkpoint_lock = threading.Lock()
+    writer = firebase_service.batch_writer()
+    
+    def process_video(video):
         try:
-            print(f"\nBuscando transcrição para: {video['id']}")
-            
             # Get transcript from YouTube
-            transcript_data = youtube_service.get_video_transcript(video['id'])
+            transcript_data = youtube_service.get_video_transcript(video['id'], raise_on_error=True)
             
             # Keep all existing video data
             updated_video = video.copy()
@@ -94,21 +164,124 @@ def process_missing_transcripts():
             })
             
             # Save updated video data
-            firebase_service.save_video_data(updated_video)
+            firebase_service.save_video_data(updated_video, writer=writer)
             
-            if transcript_data['has_transcript']:
-                print(f"✅ Transcrição salva com sucesso para: {video['id']}")
-            else:
-                print(f"⚠️ Nenhuma transcrição disponível para: {video['id']}")
+            log_item(logger, "Transcrição processada (disponível: %s)", transcript_data['has_transcript'],
+                     video_id=video['id'], stage='transcripts')
+                
+        except Exception as e:
+            # Not checkpointed, so the video is retried on the next run
+            logger.error("Erro ao processar transcrição: %s", e, extra={'video_id': video['id'], 'stage': 'transcripts'})
+            return
+            
+        with checkpoint_lock:
+            processed_ids.add(video['id'])
+            if len(processed_ids) % TRANSCRIPTS_CHECKPOINT_INTERVAL == 0:
+                # Only checkpoint videos whose writes are committed
+                writer.flush()
+                firebase_service.save_checkpoint(TRANSCRIPTS_CHECKPOINT, {'processed_ids': list(processed_ids)})
+    
+    run_concurrently(process_video, videos, TRANSCRIPT_CONCURRENCY)
+    
+    writer.flush()
+    if writer.failures:
+        # Keep the checkpoint so the failed videos are processed again
+        logger.error("%d vídeos não puderam ser salvos", len(writer.failures), extra={'stage': 'transcripts'})
+        # videos/{id} or videos/{id}/transcript/{part}
+        failed_ids = {failure['path'].split('/')[1] for failure in writer.failures}
+        firebase_service.save_checkpoint(TRANSCRIPTS_CHECKPOINT, {'processed_ids': list(processed_ids - failed_ids)})
+        return
+        
+    firebase_service.delete_checkpoint(TRANSCRIPTS_CHECKPOINT)
+    logger.info("Processamento de transcrições finalizado!", extra={'stage': 'transcripts'})
+
+def process_summary_batches(pending_videos=None):
+    """
+    Submit pending video summaries as a Message Batch and collect finished batches.
+    
+    Results are saved as video insights with their summary_key, so processing
+    the channels again reuses them for the weekly channel summaries. Batches
+    still processing after SUMMARY_BATCH_WAIT_SECONDS stay PENDING in Firestore
+    and are collected by a later call. Returns whether every batch was collected.
+    """
+    logger.info("Processando lotes de resumos", extra={'stage': 'summary_batch'})
+    
+    batches = firebase_service.get_pending_summary_batches()
+    
+    # Videos already waiting in an earlier batch are not submitted again
+    batched_ids = {video_id for batch in batches for video_id in batch['videos']}
+    pending_videos = [video for video in pending_videos or [] if video['id'] not in batched_ids]
+    
+    if pending_videos:
+        batch_data = claude_service.submit_summary_batch(pending_videos)
+        if batch_data:
+            firebase_service.save_summary_batch(batch_data)
+            batches.append(batch_data)
             
-            # Wait a bit to avoid rate limiting
-            time.sleep(1)
+    if not batches:
+        logger.info("Nenhum lote de resumos pendente.", extra={'stage': 'summary_batch'})
+        return True
+        
+    deadline = time.monotonic() + SUMMARY_BATCH_WAIT_SECONDS
+    while batches:
+        for batch in list(batches):
+            results = claude_service.get_summary_batch_results(batch['batch_id'])
+            if results is None:
+                continue
+                
+            with firebase_service.batch_writer() as writer:
+                for video_id, summary_data in results.items():
+                    video = batch['videos'].get(video_id)
+                    if not video or not summary_data['has_summary']:
+                        continue
+                    firebase_service.save_insight({
+                        'content': summary_data['summary'],
+                        'origin_id': video_id,
+                        'type': 'video',
+                        'title': video['title'],
+                        'summary_key': video['summary_key']
+                    }, writer=writer)
+                    
+            firebase_service.complete_summary_batch(batch['batch_id'])
+            logger.info("Lote de resumos %s concluído com %d resultados", batch['batch_id'], len(results),
+                        extra={'stage': 'summary_batch'})
+            batches.remove(batch)
             
-        except Exception as e:
-            print(f"❌ Erro ao processar transcrição do vídeo {video['id']}: {str(e)}")
-            continue
+        if not batches or time.monotonic() + SUMMARY_BATCH_POLL_SECONDS > deadline:
+            break
+        time.sleep(SUMMARY_BATCH_POLL_SECONDS)
+        
+    if batches:
+        logger.warning("%d lotes de resumos ainda em processamento, serão coletados na próxima execução", len(batches),
+                       extra={'stage': 'summary_batch'})
+    return not batches
+
+def summarize_batched_channels(channels, pending_summaries, weekly_summaries):
+    """
+    Batch summary mode: send the videos each channel left without a summary
+    as one Message Batch and, once it is collected, process those channels
+    again so their weekly summaries include the batch results.
     
-    print("\nProcessamento de transcrições finalizado!")
+    pending_summaries holds the videos left by each channel and
+    weekly_summaries the channel summaries, both by channel doc_id; the
+    latter is updated in place. Returns whether every channel is complete,
+    i.e. no batch is still processing and no video was left without a summary.
+    """
+    videos = [video for channel_videos in pending_summaries.values() for video in channel_videos]
+    if not process_summary_batches(videos):
+        return False
+        
+    waiting = [channel for channel in channels if pending_summaries.get(channel['doc_id'])]
+    if not waiting:
+        return True
+    logger.info("Atualizando resumos semanais de %d canais com os resumos do lote", len(waiting), extra={'stage': 'summary_batch'})
+    
+    def process_again(channel):
+        left = []
+        weekly_summaries[channel['doc_id']] = process_single_channel(channel, left)
+        return not left
+        
+    return all(run_concurrently(process_again, waiting, CHANNEL_WORKERS))
 
 def check_master_summary_exists(firebase_service):
     """Check if a master summary exists for the last 7 days"""
@@ -120,14 +293,14 @@ def check_master_summary_exists(firebase_service):
     if latest_master and 'created_at' in latest_master:
         last_summary_date = latest_master['created_at'].timestamp()
         if time.time() - last_summary_date < 604800:  # 7 days in seconds
-            print("Master summary already exists for the last 7 days")
+            logger.info("Master summary already exists for the last 7 days", extra={'stage': 'master_summary'})
             return True
             
     return False
 
 def generate_master_from_existing_data(firebase_service, claude_service):
     """Generate master summary from existing channel summaries in the last 7 days"""
-    print("\nGerando resumo consolidado a partir dos dados existentes...")
+    logger.info("Gerando resumo consolidado a partir dos dados existentes...", extra={'stage': 'master_summary'})
     
     seven_days_ago = (datetime.now(timezone.utc) - timedelta(days=7))
     
@@ -146,108 +319,199 @@ def generate_master_from_existing_data(firebase_service, claude_service):
                 'created_at': datetime.now(timezone.utc)
             }
             firebase_service.save_insight(consolidated_insight)
-            print("Resumo consolidado gerado e salvo com sucesso!")
+            logger.info("Resumo consolidado gerado e salvo com sucesso!", extra={'stage': 'master_summary'})
             return True
             
-    print("❌ Não foi possível gerar o resumo consolidado dos dados existentes")
+    logger.warning("Não foi possível gerar o resumo consolidado dos dados existentes", extra={'stage': 'master_summary'})
     return False
 
-def process_single_channel(channel):
-    """Process a single channel and return its weekly summary if available"""
-    print(f"\nProcessando canal: {channel['channel_id']}")
+def process_single_channel(channel, pending_summaries=None, raise_on_error=False):
+    """Process a single channel and return its weekly summary if available
+    
+    When pending_summaries is a list (batch summary mode), videos without a
+    stored summary are appended to it instead of being summarized here.
+    Errors are logged and None is returned, or raised when raise_on_error is
+    set so the caller can retry the channel.
+    """
+    logger.info("Processando canal", extra={'channel_id': channel['channel_id']})
+    
+    # Channel, video and insight writes are committed together in batches
+    writer = firebase_service.batch_writer()
+    # Set once the channel document records this run's latest upload, and
+    # cleared again below unless the run completes
+    saved_latest_video_id = False
+    completed = False
     
     try:
         # Skip if updated in last 24 hours
         if 'updated_at' in channel:
             last_updated = channel['updated_at'].timestamp()
             if time.time() - last_updated < 86400:
-                print(f"Canal {channel['channel_id']} já foi atualizado nas últimas 24 horas.")
+                logger.info("Canal já foi atualizado nas últimas 24 horas.", extra={'channel_id': channel['channel_id']})
                 return None
         
+        # Cheap pre-check (RSS feed, no quota) before any other work
+        seven_days_ago = (datetime.now(timezone.utc) - timedelta(days=7)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        latest_video_id = youtube_service.get_latest_video_id(channel['channel_id'], channel.get('uploads_playlist_id'))
+        if channel_unchanged(channel, latest_video_id, seven_days_ago):
+            logger.info("Canal sem novos vídeos desde o último processamento, reutilizando o resumo semanal",
+                        extra={'channel_id': channel['channel_id']})
+            metrics.increment('channels.skipped_unchanged')
+            return stored_channel_summary(channel)
+        
         # Get channel info and recent videos
-        print("Buscando informações e vídeos recentes...")
+        logger.debug("Buscando informações e vídeos recentes...", extra={'channel_id': channel['channel_id']})
         channel_info = youtube_service.get_channel_info(channel['channel_id'])
-        videos = youtube_service.get_recent_videos(channel['channel_id'])
         
         if not channel_info:
-            print(f"❌ Não foi possível obter informações do canal {channel['channel_id']}")
+            logger.error("Não foi possível obter informações do canal", extra={'channel_id': channel['channel_id']})
             return None
             
-        # Save channel info
+        # Only videos newer than the last one seen are discovered on YouTube
+        last_seen_video_id = channel.get('last_seen_video_id')
+        videos = youtube_service.get_recent_videos(
+            channel['channel_id'],
+            uploads_playlist_id=channel_info.get('uploads_playlist_id'),
+            last_seen_video_id=last_seen_video_id
+        )
+        
+        # Save channel info, including the newest video seen for the next run
         updated_channel = {
             **channel_info,
             'doc_id': channel['doc_id']
         }
+        if videos:
+            updated_channel['last_seen_video_id'] = videos[0]['id']
+            
+        # Videos seen in previous runs that are still inside the 7-day window
+        video_map = {}
+        if last_seen_video_id:
+            stored_videos = firebase_service.get_channel_videos_since(
+                channel['channel_id'],
+                seven_days_ago,
+                field_paths=VIDEO_PIPELINE_FIELDS
+            )
+            video_map.update({video['id']: video for video in stored_videos})
         
-        print(f"Atualizando informações do canal: {channel_info['title']}")
-        firebase_service.save_channel_data(updated_channel)
+        # First, save all new videos; videos already stored keep their saved data.
+        # Everything below reads from video_map instead of reloading from Firestore.
+        new_videos = [video for video in videos if video['id'] not in video_map]
+        stored_videos = firebase_service.get_videos(
+            [video['id'] for video in new_videos],
+            field_paths=VIDEO_PIPELINE_FIELDS
+        )
+        for video in new_videos:
+            if video['id'] in stored_videos:
+                video_map[video['id']] = stored_videos[video['id']]
+            else:
+                log_item(logger, "Salvando novo vídeo: %s", video['title'], channel_id=channel['channel_id'], video_id=video['id'])
+                firebase_service.save_video_data(video, writer=writer)
+                video_map[video['id']] = video
 
         # Process and save videos and their summaries separately
-        print(f"Encontrados {len(videos)} vídeos nos últimos 7 dias")
-        
-        # First, save all videos and try to get their transcripts
-        for video in videos:
-            video_exists = firebase_service.get_video(video['id'])
-            if not video_exists:
-                print(f"Salvando novo vídeo: {video['title']}")
-                firebase_service.save_video_data(video)
+        logger.info("Encontrados %d vídeos nos últimos 7 dias", len(video_map), extra={'channel_id': channel['channel_id']})
         
         # Check if at least one video has transcript
         has_any_transcript = False
         videos_with_transcripts = []
         videos_without_transcripts = []
         
-        for video in videos:
-            video_data = firebase_service.get_video(video['id'])
-            if video_data and video_data.get('has_transcript', False):
+        for video_data in video_map.values():
+            if video_data.get('has_transcript', False):
                 has_any_transcript = True
                 videos_with_transcripts.append(video_data)
             else:
-                print(f"⚠️ Vídeo sem transcrição: {video['title']}")
-                videos_without_transcripts.append(video)
+                log_item(logger, "Vídeo sem transcrição: %s", video_data['title'], channel_id=channel['channel_id'], video_id=video_data['id'])
+                videos_without_transcripts.append(video_data)
+        
+        # What the next run compares against to skip the channel if nothing changed
+        if latest_video_id:
+            updated_channel['latest_video_id'] = latest_video_id
+            updated_channel['videos_without_transcript'] = len(videos_without_transcripts)
+            updated_channel['oldest_recent_video_at'] = min(
+                (video['published_at'] for video in video_map.values()), default=None
+            )
+            saved_latest_video_id = True
+        
+        logger.debug("Atualizando informações do canal: %s", channel_info['title'], extra={'channel_id': channel['channel_id']})
+        firebase_service.save_channel_data(updated_channel, writer=writer)
         
         if not has_any_transcript:
-            print(f"❌ Pulando resumo semanal para {channel_info['title']} - nenhum vídeo tem transcrição")
+            logger.info("Pulando resumo semanal para %s - nenhum vídeo tem transcrição", channel_info['title'], extra={'channel_id': channel['channel_id']})
+            completed = True
             return None
             
-        print(f"✅ {len(videos_with_transcripts)} vídeos com transcrição encontrados")
-        if videos_without_transcripts:
-            print(f"⚠️ {len(videos_without_transcripts)} vídeos sem transcrição serão ignorados no resumo")
+        logger.info("%d vídeos com transcrição encontrados, %d sem transcrição serão ignorados no resumo",
+                    len(videos_with_transcripts), len(videos_without_transcripts), extra={'channel_id': channel['channel_id']})
+        
+        # Stored videos were read without their transcript text
+        stored_with_transcripts = [video for video in videos_with_transcripts if not video.get('transcript')]
+        if stored_with_transcripts:
+            transcripts = firebase_service.get_transcripts(stored_with_transcripts)
+            for video in stored_with_transcripts:
+                video['transcript'] = transcripts.get(video['id'], '')
             
         # Generate and save summaries for videos with transcripts
+        # Videos summarized in previous runs reuse their insight when nothing changed
+        previous_insights = firebase_service.get_video_insights([video['id'] for video in videos_with_transcripts])
         videos_with_summaries = []
         for video in videos_with_transcripts:
-            summary_data = youtube_service.generate_video_summary(video)
+            # Long transcripts are summarized in chunks right away, even in batch mode
+            batch_summary = pending_summaries is not None and not claude_service.needs_chunking(video['transcript'])
+            summary_data = youtube_service.generate_video_summary(
+                video,
+                previous_insights.get(video['id']),
+                cached_only=batch_summary
+            )
+            if not summary_data['has_summary'] and batch_summary:
+                pending_summaries.append(video)
+                continue
+                
             if summary_data['has_summary']:
                 video.update(summary_data)
                 videos_with_summaries.append(video)
                 
+                if summary_data.get('summary_cached'):
+                    continue
+                    
                 insight_data = {
                     'content': summary_data['summary'],
                     'origin_id': video['id'],
                     'type': 'video',
-                    'title': f"{video['title']}"
+                    'title': f"{video['title']}",
+                    'summary_key': summary_data['summary_key']
                 }
-                firebase_service.save_insight(insight_data)
+                firebase_service.save_insight(insight_data, writer=writer)
         
         # Generate weekly channel summary if we have videos with summaries
         if videos_with_summaries:
+            previous_summary = None
+            if CHANNEL_SUMMARY_MODE == 'incremental':
+                previous_summary = firebase_service.get_latest_channel_summary(channel['channel_id'])
+                
             weekly_summary = youtube_service.generate_weekly_channel_summary(
                 channel_info['title'],
-                videos_with_summaries
+                videos_with_summaries,
+                previous_summary=previous_summary
             )
             
             if weekly_summary['has_weekly_summary']:
-                insight_data = {
-                    'content': weekly_summary['weekly_summary'],
-                    'origin_id': channel['channel_id'],
-                    'type': 'channel',
-                    'title': f"{channel_info['title']}",
-                    'created_at': datetime.now(timezone.utc)
-                }
-                firebase_service.save_insight(insight_data)
+                # An unchanged summary is already stored
+                if not weekly_summary['weekly_summary_cached']:
+                    insight_data = {
+                        'content': weekly_summary['weekly_summary'],
+                        'origin_id': channel['channel_id'],
+                        'type': 'channel',
+                        'title': f"{channel_info['title']}",
+                        'video_summary_keys': weekly_summary['video_summary_keys'],
+                        'created_at': datetime.now(timezone.utc)
+                    }
+                    firebase_service.save_insight(insight_data, writer=writer)
                 
+                # Videos left for the summary batch or whose summary failed must be retried
+                completed = len(videos_with_summaries) == len(videos_with_transcripts)
                 return {
+                    'channel_id': channel['channel_id'],
                     'channel_title': channel_info['title'],
                     'summary': weekly_summary['weekly_summary']
                 }
@@ -255,35 +519,81 @@ def process_single_channel(channel):
         return None
         
     except Exception as e:
-        print(f"❌ Erro ao processar canal {channel['channel_id']}: {str(e)}")
+        logger.exception("Erro ao processar canal: %s", e, extra={'channel_id': channel['channel_id']})
+        if raise_on_error:
+            raise
         return None
+        
+    finally:
+        if saved_latest_video_id and not completed:
+            # Incomplete run: make sure the next one doesn't skip the channel
+            firebase_service.save_channel_data({'doc_id': channel['doc_id'], 'latest_video_id': None}, writer=writer)
+        writer.flush()
 
 def run_full_process():
     """Run the complete channel processing flow"""
     if handle_cli_commands():
         return
         
-    print("Iniciando o processo de atualização...")
+    metrics.reset()
+    try:
+        run_update_process()
+    finally:
+        save_run_metrics()
+
+def save_run_metrics(**tags):
+    """Store the stage timings and quota counters of this run, with tags such as run_id"""
+    report = {**metrics.report(), **tags}
+    counters = report['counters']
+    logger.info("Execução concluída em %ss", report['duration_seconds'], extra={'stage': 'run', 'counters': counters, **tags})
+    
+    try:
+        firebase_service.save_run_report(report)
+    except Exception as e:
+        logger.error("Erro ao salvar métricas da execução: %s", e)
+        
+    if METRICS_OPENMETRICS_PATH:
+        with open(METRICS_OPENMETRICS_PATH, 'w') as f:
+            f.write(metrics.to_openmetrics())
+        logger.info("Métricas exportadas para %s", METRICS_OPENMETRICS_PATH)
+
+def run_update_process():
+    """Update the active channels and the master summary"""
+    logger.info("Iniciando o processo de atualização...")
     
     # Process any pending channels first -> get channel ID from channel URL
     process_pending_channels()
     
     # Process active channels to update their summaries
-    print("\nBuscando canais ativos do Firebase...")
     channels = firebase_service.get_active_channels()
-    print(f"Encontrados {len(channels)} canais ativos para processar")
+    logger.info("Encontrados %d canais ativos para processar", len(channels))
     
-    # Store each individual channel weekly summary
-    all_weekly_summaries = []
+    if PROCESS_MODE == 'fanout':
+        start_work_run(channels)
+        return
     
-    for channel in channels:
-        weekly_summary = process_single_channel(channel)
-        if weekly_summary:
-            all_weekly_summaries.append(weekly_summary)
+    # In batch mode new video summaries are collected per channel and sent as one Message Batch
+    pending_summaries = {channel['doc_id']: [] for channel in channels} if SUMMARY_MODE == 'batch' else {}
+    
+    # Channels are independent, so they are processed concurrently; calls to each
+    # external service are bounded by the limits in concurrency.py
+    results = run_concurrently(
+        lambda channel: process_single_channel(channel, pending_summaries.get(channel['doc_id'])),
+        channels,
+        CHANNEL_WORKERS
+    )
+    # Store each individual channel weekly summary
+    weekly_summaries = {channel['doc_id']: weekly_summary for channel, weekly_summary in zip(channels, results)}
             
-        print("Aguardando 1 segundo antes do próximo canal...")
-        time.sleep(1)
+    if SUMMARY_MODE == 'batch' and not summarize_batched_channels(channels, pending_summaries, weekly_summaries):
+        # The channel summaries still miss videos, and a master generated now would block a complete one for 7 days
+        logger.info("Resumo master adiado até que os resumos em lote sejam coletados", extra={'stage': 'master_summary'})
+        return
 
+    update_master_summary([weekly_summary for weekly_summary in weekly_summaries.values() if weekly_summary])
+
+def update_master_summary(all_weekly_summaries):
+    """Generate the master summary unless a recent one exists"""
     # Check if we already have a recent master summary
     if check_master_summary_exists(firebase_service):
         return
@@ -294,7 +604,7 @@ def run_full_process():
     
     # If we have new summaries from channel processing, try to generate master summary
     if all_weekly_summaries:
-        print("\nGerando resumo consolidado de todos os canais...")
+        logger.info("Gerando resumo consolidado de todos os canais...", extra={'stage': 'master_summary'})
         master_summary = claude_service.create_master_weekly_summary(all_weekly_summaries)
         
         if master_summary['has_master_summary']:
@@ -306,11 +616,126 @@ def run_full_process():
                 'created_at': datetime.now(timezone.utc)
             }
             firebase_service.save_insight(consolidated_insight)
-            print("Resumo consolidado gerado e salvo com sucesso!")
+            logger.info("Resumo consolidado gerado e salvo com sucesso!", extra={'stage': 'master_summary'})
         else:
-            print("❌ Não foi possível gerar o resumo consolidado")
+            logger.warning("Não foi possível gerar o resumo consolidado", extra={'stage': 'master_summary'})
+    
+    logger.info("Processamento finalizado!")
+
+# Fan-out mode (PROCESS_MODE=fanout): the run that starts the process only
+# enqueues one task per channel; worker functions process the channels in
+# parallel and the last one to finish generates the master summary
+
+def current_run_id():
+    """Runs are daily, so enqueueing the same day again adds only new channels"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+def start_work_run(channels, run_id=None):
+    """Coordinator: enqueue a task for each channel and dispatch the new ones"""
+    queue = get_work_queue()
+    run_id = run_id or current_run_id()
+    
+    # Task IDs are idempotency keys: one task per channel and run
+    tasks = {f"{run_id}_{channel['doc_id']}": channel for channel in channels}
+    task_ids = queue.enqueue(run_id, tasks)
+    metrics.increment('work_queue.enqueued', len(task_ids))
+    logger.info("Execução %s: %d tarefas enfileiradas para %d canais", run_id, len(task_ids), len(channels), extra={'stage': 'coordinator'})
+    
+    queue.dispatch(task_ids, lambda task_id: run_work_task(run_id, task_id))
+    
+    # Nothing to wait for, e.g. no active channels
+    if queue.try_finalize(run_id):
+        finalize_work_run(queue, run_id)
+
+def run_work_task(run_id, task_id=None):
+    """
+    Worker: process the given task, then any task of the run that needs another
+    attempt. Called without task_id it only picks up those retries, e.g. to
+    recover tasks whose workers stopped.
+    """
+    queue = get_work_queue()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    
+    task = queue.claim(task_id, worker_id) if task_id else None
+    if task_id and not task:
+        logger.info("Tarefa %s já concluída ou em andamento", task_id, extra={'stage': 'worker'})
+    if not task:
+        task = queue.claim_next(run_id, worker_id)
+        
+    while task:
+        process_work_task(queue, task)
+        task = queue.claim_next(run_id, worker_id)
+        
+    if queue.try_finalize(run_id):
+        finalize_work_run(queue, run_id)
+
+def process_work_task(queue, task):
+    """Process a task's channel and record the outcome in the queue
     
-    print("\nProcessamento finalizado!")
+    In batch summary mode the videos left without a summary are only recorded
+    in the task result; the finalizer sends the whole run's videos as one
+    Message Batch, so no two workers submit or collect batches.
+    Workers in their own function instance keep a metrics report per task.
+    In-process workers are part of the coordinator's run and its report.
+    """
+    channel = task['payload']
+    pending_summaries = [] if SUMMARY_MODE == 'batch' else None
+    if not queue.in_process:
+        metrics.reset()
+    try:
+        weekly_summary = process_single_channel(channel, pending_summaries, raise_on_error=True)
+        queue.complete(task['id'], {
+            'channel': channel,
+            'weekly_summary': weekly_summary,
+            'pending_video_ids': [video['id'] for video in pending_summaries or []]
+        })
+        metrics.increment('work_queue.completed')
+    except Exception as e:
+        logger.warning("Tarefa %s falhou na tentativa %d: %s", task['id'], task['attempts'], e,
+                       extra={'channel_id': channel['channel_id'], 'stage': 'worker'})
+        metrics.increment('work_queue.failed_attempts')
+        queue.fail(task['id'], str(e))
+    finally:
+        if not queue.in_process:
+            save_run_metrics(run_id=task['run_id'], task_id=task['id'], channel_id=channel['channel_id'])
+
+def finalize_work_run(queue, run_id):
+    """Run by the last worker of a run: collect the batched summaries and combine the channel summaries"""
+    if not queue.in_process:
+        metrics.reset()
+    try:
+        results = queue.results(run_id)
+        channels = [result['channel'] for result in results]
+        weekly_summaries = {result['channel']['doc_id']: result['weekly_summary'] for result in results}
+        
+        if SUMMARY_MODE == 'batch':
+            pending_summaries = load_pending_summaries(results)
+            if not summarize_batched_channels(channels, pending_summaries, weekly_summaries):
+                logger.info("Resumo master adiado até que os resumos em lote sejam coletados", extra={'stage': 'master_summary'})
+                return
+                
+        weekly_summaries = [weekly_summary for weekly_summary in weekly_summaries.values() if weekly_summary]
+        logger.info("Execução %s concluída com %d resumos semanais", run_id, len(weekly_summaries), extra={'stage': 'master_summary'})
+        update_master_summary(weekly_summaries)
+    finally:
+        if not queue.in_process:
+            save_run_metrics(run_id=run_id, task_id='finalize')
+
+def load_pending_summaries(results):
+    """Read the videos the run's tasks left for the summary batch, by channel doc_id"""
+    video_ids = [video_id for result in results for video_id in result['pending_video_ids']]
+    videos = firebase_service.get_videos(video_ids, field_paths=['title', *VIDEO_TRANSCRIPT_FIELDS])
+    transcripts = firebase_service.get_transcripts(list(videos.values()))
+    for video in videos.values():
+        video['transcript'] = transcripts.get(video['id'], '')
+        
+    return {
+        result['channel']['doc_id']: [
+            videos[video_id] for video_id in result['pending_video_ids']
+            if video_id in videos and videos[video_id]['transcript']
+        ]
+        for result in results
+    }
 
 def main():
     run_full_process()
@@ -0,0 +1,62 @@
+"""
+Shared service instances.
+
+Each service is built on first use and then reused by every caller in the
+process, so importing an entry point does not connect to Firestore or load
+the YouTube and Anthropic clients until a request actually needs them.
+Service modules are imported inside the getters for the same reason.
+"""
+
+import threading
+
+_instances = {}
+_lock = threading.RLock()
+
+def _get_instance(name, factory):
+    instance = _instances.get(name)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(name)
+            if instance is None:
+                instance = factory()
+                _instances[name] = instance
+    return instance
+
+def register_service(name, instance):
+    """
+    Use instance as the shared 'firebase', 'claude', 'youtube' or 'work_queue' service,
+    e.g. to run the pipeline against local fakes.
+    """
+    with _lock:
+        _instances[name] = instance
+
+def get_firebase_service():
+    """The process-wide FirebaseService"""
+    def factory():
+        from firebase_service import FirebaseService
+        return FirebaseService()
+    return _get_instance('firebase', factory)
+
+def get_claude_service():
+    """The process-wide ClaudeService"""
+    def factory():
+        from claude_service import ClaudeService
+        return ClaudeService(get_firebase_service())
+    return _get_instance('claude', factory)
+
+def get_youtube_service():
+    """The process-wide YouTubeService, sharing the ClaudeService instance"""
+    def factory():
+        from youtube_service import YouTubeService
+        return YouTubeService(get_firebase_service(), get_claude_service())
+    return _get_instance('youtube', factory)
+
+def get_work_queue():
+    """The process-wide WorkQueue of the backend set by WORK_QUEUE_BACKEND"""
+    def factory():
+        from config import WORK_QUEUE_BACKEND
+        from work_queue import FirestoreWorkQueue, InMemoryWorkQueue
+        if WORK_QUEUE_BACKEND == 'memory':
+            return InMemoryWorkQueue()
+        return FirestoreWorkQueue(get_firebase_service().db)
+    return _get_instance('work_queue', factory)
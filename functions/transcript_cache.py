@@ -0,0 +1,159 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from config import TRANSCRIPT_CACHE_PATH, TRANSCRIPT_NEGATIVE_TTL_HOURS
+from log import get_logger
+
+logger = get_logger('transcript_cache')
+
+class TranscriptCache:
+    """
+    Cache of raw transcript segments keyed by video ID and requested languages.
+
+    Entries are looked up in a local SQLite file first and then in Firestore,
+    so repeated runs skip the transcript API for videos already seen.
+    Negative results (transcripts disabled or not found) are stored with an
+    expiry time so they are retried after TRANSCRIPT_NEGATIVE_TTL_HOURS.
+    """
+
+    def __init__(self, firebase_service, path=TRANSCRIPT_CACHE_PATH, negative_ttl_hours=TRANSCRIPT_NEGATIVE_TTL_HOURS):
+        self.firebase_service = firebase_service
+        self.negative_ttl = negative_ttl_hours * 3600
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS transcripts (
+                    key TEXT PRIMARY KEY,
+                    video_id TEXT NOT NULL,
+                    language TEXT,
+                    available INTEGER NOT NULL,
+                    segments BLOB,
+                    error TEXT,
+                    expires_at REAL
+                )"""
+            )
+            self._db.commit()
+
+    @staticmethod
+    def cache_key(video_id, languages):
+        """Content address of a transcript lookup"""
+        return hashlib.sha256(f"{video_id}\n{','.join(languages)}".encode('utf-8')).hexdigest()
+
+    def get(self, video_id, languages):
+        """
+        Get a cached transcript lookup.
+        Returns a dict with available, language, segments and error, or None on a miss.
+        """
+        key = self.cache_key(video_id, languages)
+        entry = self._get_local(key)
+        if entry is None:
+            entry = self._get_remote(key)
+            if entry is not None:
+                self._set_local(key, video_id, entry)
+                
+        if entry is None:
+            return None
+        if entry['expires_at'] and entry['expires_at'] < time.time():
+            return None
+        return entry
+
+    def set(self, video_id, languages, language, segments):
+        """Store the segments of an available transcript"""
+        entry = {
+            'available': True,
+            'language': language,
+            'segments': segments,
+            'error': None,
+            'expires_at': None
+        }
+        self._store(self.cache_key(video_id, languages), video_id, entry)
+
+    def set_unavailable(self, video_id, languages, error):
+        """Remember that a video has no transcript in the requested languages"""
+        entry = {
+            'available': False,
+            'language': None,
+            'segments': [],
+            'error': error,
+            'expires_at': time.time() + self.negative_ttl
+        }
+        self._store(self.cache_key(video_id, languages), video_id, entry)
+
+    def _store(self, key, video_id, entry):
+        self._set_local(key, video_id, entry)
+        try:
+            self.firebase_service.save_cached_transcript(key, {
+                'video_id': video_id,
+                'language': entry['language'],
+                'available': entry['available'],
+                'segments': _compress_segments(entry['segments']),
+                'error': entry['error'],
+                'expires_at': entry['expires_at']
+            })
+        except Exception as e:
+            # The local tier still has the entry; Firestore rejects documents over 1 MiB
+            logger.warning("Erro ao salvar transcrição em cache no Firestore: %s", e, extra={'video_id': video_id})
+
+    def _get_local(self, key):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT language, available, segments, error, expires_at FROM transcripts WHERE key = ?",
+                (key,)
+            ).fetchone()
+        if not row:
+            return None
+            
+        language, available, segments, error, expires_at = row
+        return {
+            'available': bool(available),
+            'language': language,
+            'segments': _decompress_segments(segments),
+            'error': error,
+            'expires_at': expires_at
+        }
+
+    def _set_local(self, key, video_id, entry):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO transcripts (key, video_id, language, available, segments, error, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    video_id,
+                    entry['language'],
+                    int(entry['available']),
+                    _compress_segments(entry['segments']),
+                    entry['error'],
+                    entry['expires_at']
+                )
+            )
+            self._db.commit()
+
+    def _get_remote(self, key):
+        try:
+            data = self.firebase_service.get_cached_transcript(key)
+        except Exception as e:
+            logger.warning("Erro ao ler transcrição em cache do Firestore: %s", e)
+            return None
+        if not data:
+            return None
+            
+        return {
+            'available': data.get('available', False),
+            'language': data.get('language'),
+            'segments': _decompress_segments(data.get('segments')),
+            'error': data.get('error'),
+            'expires_at': data.get('expires_at')
+        }
+
+def _compress_segments(segments):
+    return zlib.compress(json.dumps(segments, ensure_ascii=False).encode('utf-8'))
+
+def _decompress_segments(data):
+    if not data:
+        return []
+    return json.loads(zlib.decompress(data).decode('utf-8'))
@@ -0,0 +1,355 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from concurrency import limit, run_concurrently
+from metrics import metrics
+from config import CHANNEL_WORKERS, WORK_QUEUE_LEASE_SECONDS, WORK_QUEUE_MAX_ATTEMPTS
+from log import get_logger
+
+logger = get_logger('work_queue')
+
+# Task states; done and failed are final
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+class WorkQueue(ABC):
+    """
+    Queue of the tasks of a processing run, one per channel.
+
+    A task's ID is its idempotency key: enqueueing it again is a no-op, so a
+    coordinator that runs twice does not duplicate work. Workers claim a task
+    with a lease of WORK_QUEUE_LEASE_SECONDS; a task whose worker failed or
+    stopped (lease expired) can be claimed again until it has been tried
+    WORK_QUEUE_MAX_ATTEMPTS times, after which it is marked as failed. The
+    run keeps count of finished tasks, so exactly one worker (the one that
+    sees the last task finish) gets to finalize it.
+
+    Task dicts have id, run_id, payload, status, attempts and result.
+    """
+
+    # Whether workers run in the process that enqueued the tasks
+    in_process = False
+
+    def __init__(self, lease_seconds=WORK_QUEUE_LEASE_SECONDS, max_attempts=WORK_QUEUE_MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    @abstractmethod
+    def enqueue(self, run_id, tasks):
+        """Add tasks ({task ID: payload}) to a run; returns the IDs of the tasks that were new"""
+
+    @abstractmethod
+    def dispatch(self, task_ids, worker):
+        """Start processing newly enqueued tasks by calling worker(task_id)"""
+
+    @abstractmethod
+    def claim(self, task_id, worker_id):
+        """Lease a task that is pending or whose lease expired; returns the task or None"""
+
+    @abstractmethod
+    def claim_next(self, run_id, worker_id):
+        """
+        Lease a task of the run that needs another attempt (failed before or
+        its lease expired). Tasks never tried are left to the worker they were
+        dispatched to. Returns the task or None.
+        """
+
+    @abstractmethod
+    def complete(self, task_id, result):
+        """Mark a leased task as done and keep its result for the run"""
+
+    @abstractmethod
+    def fail(self, task_id, error):
+        """Release a task for another attempt, or mark it as failed when it has none left"""
+
+    @abstractmethod
+    def try_finalize(self, run_id):
+        """True, exactly once per run, when all of its tasks are done or failed; False for unknown runs"""
+
+    @abstractmethod
+    def results(self, run_id):
+        """Results of the run's completed tasks"""
+
+    def _claimable(self, task, now, retries_only=False):
+        if task['status'] == PENDING:
+            return not retries_only or task['attempts'] > 0
+        return task['status'] == LEASED and task['lease_expires_at'] <= now
+
+class InMemoryWorkQueue(WorkQueue):
+    """
+    In-process queue for local runs and tests: dispatch() runs the workers in
+    a thread pool of CHANNEL_WORKERS threads and returns when they finish.
+    """
+
+    in_process = True
+
+    def __init__(self, max_workers=CHANNEL_WORKERS, **kwargs):
+        super().__init__(**kwargs)
+        self.max_workers = max_workers
+        self._tasks = {}
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def enqueue(self, run_id, tasks):
+        with self._lock:
+            new_ids = [task_id for task_id in tasks if task_id not in self._tasks]
+            run = self._runs.setdefault(run_id, {'total': 0, 'finished': 0, 'finalized': False})
+            run['total'] += len(new_ids)
+            for task_id in new_ids:
+                self._tasks[task_id] = {
+                    'id': task_id,
+                    'run_id': run_id,
+                    'payload': tasks[task_id],
+                    'status': PENDING,
+                    'attempts': 0,
+                    'lease_expires_at': None,
+                    'result': None
+                }
+            return new_ids
+
+    def dispatch(self, task_ids, worker):
+        run_concurrently(worker, task_ids, self.max_workers)
+
+    def claim(self, task_id, worker_id):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if not task or not self._claimable(task, time.time()):
+                return None
+            return self._lease(task, worker_id)
+
+    def claim_next(self, run_id, worker_id):
+        with self._lock:
+            now = time.time()
+            for task in self._tasks.values():
+                if task['run_id'] == run_id and self._claimable(task, now, retries_only=True):
+                    claimed = self._lease(task, worker_id)
+                    if claimed:
+                        return claimed
+            return None
+
+    def complete(self, task_id, result):
+        with self._lock:
+            self._finish(self._tasks[task_id], DONE, result=result)
+
+    def fail(self, task_id, error):
+        with self._lock:
+            task = self._tasks[task_id]
+            if task['status'] != LEASED:
+                return
+            if task['attempts'] >= self.max_attempts:
+                self._finish(task, FAILED, error=error)
+            else:
+                task.update(status=PENDING, lease_expires_at=None, error=error)
+
+    def try_finalize(self, run_id):
+        with self._lock:
+            run = self._runs.get(run_id)
+            if not run or run['finalized'] or run['finished'] < run['total']:
+                return False
+            run['finalized'] = True
+            return True
+
+    def results(self, run_id):
+        with self._lock:
+            return [task['result'] for task in self._tasks.values()
+                    if task['run_id'] == run_id and task['status'] == DONE]
+
+    def _lease(self, task, worker_id):
+        # A task whose last worker stopped on its final attempt is not retried
+        if task['attempts'] >= self.max_attempts:
+            self._finish(task, FAILED, error='lease expired')
+            return None
+        task.update(status=LEASED, attempts=task['attempts'] + 1, worker_id=worker_id,
+                    lease_expires_at=time.time() + self.lease_seconds)
+        return dict(task)
+
+    def _finish(self, task, status, **fields):
+        if task['status'] in (DONE, FAILED):
+            return
+        task.update(status=status, lease_expires_at=None, **fields)
+        self._runs[task['run_id']]['finished'] += 1
+
+class FirestoreWorkQueue(WorkQueue):
+    """
+    Queue stored in Firestore: tasks in work_queue/{task ID} and run counters
+    in work_runs/{run ID}. Every state change is a transaction, so concurrent
+    workers on different instances never lease the same task or count it
+    twice. Tasks are dispatched by the document creation trigger in main.py.
+    """
+
+    TASKS = 'work_queue'
+    RUNS = 'work_runs'
+
+    def __init__(self, db, **kwargs):
+        super().__init__(**kwargs)
+        self.db = db
+
+    def enqueue(self, run_id, tasks):
+        from google.api_core.exceptions import AlreadyExists
+        from firebase_admin import firestore
+
+        # While enqueuing is set the total is not final and the run can't be
+        # finalized, even if every task counted so far has finished
+        run_ref = self.db.collection(self.RUNS).document(run_id)
+        try:
+            with limit('firestore'):
+                run_ref.create({
+                    'total': 0,
+                    'finished': 0,
+                    'finalized': False,
+                    'enqueuing': True,
+                    'created_at': datetime.now(timezone.utc)
+                })
+        except AlreadyExists:
+            logger.info("Execução %s já existe, enfileirando apenas tarefas novas", run_id)
+            with limit('firestore'):
+                run_ref.update({'enqueuing': True})
+        metrics.increment('firestore.writes')
+
+        new_ids = []
+        for task_id, payload in tasks.items():
+            try:
+                # create() fails on an existing document, which makes the task ID an idempotency key
+                with limit('firestore'):
+                    self.db.collection(self.TASKS).document(task_id).create({
+                        'run_id': run_id,
+                        'payload': payload,
+                        'status': PENDING,
+                        'attempts': 0,
+                        'lease_expires_at': None,
+                        'result': None,
+                        'created_at': datetime.now(timezone.utc)
+                    })
+                metrics.increment('firestore.writes')
+                new_ids.append(task_id)
+            except AlreadyExists:
+                continue
+                
+        # Counting the run's task documents keeps the total right even when an
+        # earlier enqueue of the run stopped partway through
+        with limit('firestore'):
+            total = (self.db.collection(self.TASKS)
+                     .where(filter=firestore.FieldFilter('run_id', '==', run_id))
+                     .count()
+                     .get())[0][0].value
+            run_ref.update({'total': total, 'enqueuing': False})
+        metrics.increment('firestore.reads')
+        metrics.increment('firestore.writes')
+        return new_ids
+
+    def dispatch(self, task_ids, worker):
+        # Each created task document starts its own worker function
+        pass
+
+    def claim(self, task_id, worker_id):
+        return self._transact(self._claim, task_id, worker_id)
+
+    def claim_next(self, run_id, worker_id):
+        from firebase_admin import firestore
+
+        now = datetime.now(timezone.utc)
+        with limit('firestore'):
+            candidates = list(self.db.collection(self.TASKS)
+                              .where(filter=firestore.FieldFilter('run_id', '==', run_id))
+                              .where(filter=firestore.FieldFilter('status', 'in', [PENDING, LEASED]))
+                              .select(['status', 'attempts', 'lease_expires_at'])
+                              .stream())
+        metrics.increment('firestore.reads', max(1, len(candidates)))
+        for doc in candidates:
+            if self._claimable(doc.to_dict(), now, retries_only=True):
+                task = self.claim(doc.id, worker_id)
+                if task:
+                    return task
+        return None
+
+    def complete(self, task_id, result):
+        self._transact(self._finish, task_id, DONE, {'result': result})
+
+    def fail(self, task_id, error):
+        self._transact(self._fail, task_id, error)
+
+    def try_finalize(self, run_id):
+        return self._transact(self._finalize, run_id)
+
+    def results(self, run_id):
+        from firebase_admin import firestore
+
+        with limit('firestore'):
+            docs = list(self.db.collection(self.TASKS)
+                        .where(filter=firestore.FieldFilter('run_id', '==', run_id))
+                        .where(filter=firestore.FieldFilter('status', '==', DONE))
+                        .select(['result'])
+                        .stream())
+        metrics.increment('firestore.reads', max(1, len(docs)))
+        return [doc.to_dict().get('result') for doc in docs]
+
+    def _transact(self, func, *args):
+        from firebase_admin import firestore
+
+        with limit('firestore'), metrics.timer(f"firestore.work_queue.{func.__name__.lstrip('_')}"):
+            return firestore.transactional(func)(self.db.transaction(), *args)
+
+    def _claim(self, transaction, task_id, worker_id):
+        task_ref = self.db.collection(self.TASKS).document(task_id)
+        snapshot = task_ref.get(transaction=transaction)
+        metrics.increment('firestore.reads')
+        if not snapshot.exists:
+            return None
+        task = snapshot.to_dict()
+        if not self._claimable(task, datetime.now(timezone.utc)):
+            return None
+        if task['attempts'] >= self.max_attempts:
+            # The last worker stopped on the final attempt
+            self._finish_snapshot(transaction, snapshot, FAILED, {'error': 'lease expired'})
+            return None
+
+        lease = {
+            'status': LEASED,
+            'attempts': task['attempts'] + 1,
+            'worker_id': worker_id,
+            'lease_expires_at': datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+        }
+        transaction.update(task_ref, lease)
+        metrics.increment('firestore.writes')
+        return {**task, **lease, 'id': task_id}
+
+    def _fail(self, transaction, task_id, error):
+        task_ref = self.db.collection(self.TASKS).document(task_id)
+        snapshot = task_ref.get(transaction=transaction)
+        metrics.increment('firestore.reads')
+        task = snapshot.to_dict()
+        if task['status'] != LEASED:
+            return
+        if task['attempts'] >= self.max_attempts:
+            self._finish_snapshot(transaction, snapshot, FAILED, {'error': error})
+        else:
+            transaction.update(task_ref, {'status': PENDING, 'lease_expires_at': None, 'error': error})
+            metrics.increment('firestore.writes')
+
+    def _finish(self, transaction, task_id, status, fields):
+        snapshot = self.db.collection(self.TASKS).document(task_id).get(transaction=transaction)
+        metrics.increment('firestore.reads')
+        self._finish_snapshot(transaction, snapshot, status, fields)
+
+    def _finish_snapshot(self, transaction, snapshot, status, fields):
+        from firebase_admin import firestore
+
+        if snapshot.get('status') in (DONE, FAILED):
+            return
+        transaction.update(snapshot.reference, {'status': status, 'lease_expires_at': None, **fields})
+        transaction.update(self.db.collection(self.RUNS).document(snapshot.get('run_id')),
+                           {'finished': firestore.Increment(1)})
+        metrics.increment('firestore.writes', 2)
+
+    def _finalize(self, transaction, run_id):
+        run_ref = self.db.collection(self.RUNS).document(run_id)
+        run = run_ref.get(transaction=transaction).to_dict()
+        metrics.increment('firestore.reads')
+        if not run or run['finalized'] or run.get('enqueuing') or run['finished'] < run['total']:
+            return False
+        transaction.update(run_ref, {'finalized': True, 'finalized_at': datetime.now(timezone.utc)})
+        metrics.increment('firestore.writes')
+        return True
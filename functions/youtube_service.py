@@ -1,31 +1,117 @@
-from googleapiclient.discovery import build
-from datetime import datetime, timedelta
+from googleapiclient.errors import HttpError
+from datetime import datetime, timedelta, timezone
 from dateutil import parser
-from config import YOUTUBE_API_KEY
-from youtube_transcript_api import YouTubeTranscriptApi
-from youtube_transcript_api._errors import NoTranscriptAvailable, TranscriptsDisabled
-from claude_service import ClaudeService
+from config import (
+    YOUTUBE_API_KEY,
+    TRANSCRIPT_RATE_PER_SECOND,
+    TRANSCRIPT_BURST,
+    TRANSCRIPT_MAX_RETRIES,
+    TRANSCRIPT_BACKOFF_BASE_SECONDS,
+    TRANSCRIPT_BACKOFF_MAX_SECONDS,
+    YOUTUBE_HTTP_CACHE
+)
+from concurrency import limit
+from metrics import metrics, timed
+from log import get_logger, log_item
+from transcript_cache import TranscriptCache
+from http_cache import ConditionalHttp, ETagCache
+from rate_limit import TokenBucket, retry_with_backoff
 import requests
 import re
+import threading
+from functools import lru_cache
+from xml.etree import ElementTree
+
+logger = get_logger('youtube')
+
+# videos.list accepts at most 50 comma-separated IDs per request
+VIDEOS_LIST_MAX_IDS = 50
+
+# Transcript languages in order of preference; the last one is the fallback
+TRANSCRIPT_LANGUAGES = ['pt', 'pt-BR', 'en']
+
+# Only videos published in this window are processed
+RECENT_VIDEOS_DAYS = 7
+
+# Quota units charged per API method; every other method we use costs 1
+YOUTUBE_QUOTA_COSTS = {
+    'youtube.search.list': 100,
+}
+
+CHANNEL_RSS_URL = 'https://www.youtube.com/feeds/videos.xml'
+RSS_NAMESPACES = {
+    'atom': 'http://www.w3.org/2005/Atom',
+    'yt': 'http://www.youtube.com/xml/schemas/2015'
+}
+
+def _parse_datetime(value):
+    """Parse an ISO 8601 timestamp from the API into a naive UTC datetime"""
+    parsed = parser.isoparse(value)
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+@lru_cache(maxsize=None)
+def _youtube_discovery_document():
+    """
+    The YouTube Data API discovery document bundled with googleapiclient,
+    read once per process instead of once per client.
+    """
+    from googleapiclient.discovery_cache import get_static_doc
+    return get_static_doc('youtube', 'v3')
 
 class YouTubeService:
-    def __init__(self, firebase_service):
-        print("Inicializando serviço do YouTube...")
-        self.youtube = build('youtube', 'v3', developerKey=YOUTUBE_API_KEY)
-        self.claude_service = ClaudeService(firebase_service)
+    def __init__(self, firebase_service, claude_service, http_factory=None):
+        logger.debug("Inicializando serviço do YouTube...")
+        self._local = threading.local()
+        # Optional callable returning the HTTP transport of each thread's client
+        self.http_factory = http_factory
+        self.claude_service = claude_service
         self.firebase_service = firebase_service
+        self.transcript_cache = TranscriptCache(firebase_service)
+        self.http_cache = ETagCache() if YOUTUBE_HTTP_CACHE else None
+        self.transcript_rate_limiter = TokenBucket(TRANSCRIPT_RATE_PER_SECOND, TRANSCRIPT_BURST)
+
+    @property
+    def youtube(self):
+        """YouTube API client for the current thread
+        
+        googleapiclient clients share an httplib2 connection that is not
+        thread-safe, so every worker thread builds its own from the bundled
+        discovery document, without fetching it or touching the discovery cache.
+        Its transport sends conditional requests through the shared ETag cache.
+        """
+        if not hasattr(self._local, 'youtube'):
+            from googleapiclient.discovery import build_from_document
+            from googleapiclient.http import build_http
+            http = self.http_factory() if self.http_factory else build_http()
+            if self.http_cache:
+                http = ConditionalHttp(http, self.http_cache)
+            self._local.youtube = build_from_document(_youtube_discovery_document(), http=http, developerKey=YOUTUBE_API_KEY)
+        return self._local.youtube
 
+    def _execute(self, request):
+        """Execute a YouTube API request within the YouTube concurrency limit
+        
+        Each call is timed and its quota cost counted in the run metrics.
+        """
+        method = getattr(request, 'methodId', None) or 'youtube.request'
+        metrics.increment('youtube.quota_units', YOUTUBE_QUOTA_COSTS.get(method, 1))
+        with limit('youtube'), metrics.timer(method):
+            return request.execute()
+
+    @timed('youtube.get_channel_info')
     def get_channel_info(self, channel_id):
         """Get channel information"""
-        print(f"Buscando informações do canal: {channel_id}")
+        logger.debug("Buscando informações do canal", extra={'channel_id': channel_id})
         request = self.youtube.channels().list(
-            part="snippet,statistics",
+            part="snippet,statistics,contentDetails",
             id=channel_id
         )
-        response = request.execute()
+        response = self._execute(request)
         
         if not response['items']:
-            print(f"❌ Canal não encontrado: {channel_id}")
+            logger.warning("Canal não encontrado", extra={'channel_id': channel_id})
             return None
             
         channel = response['items'][0]
@@ -35,105 +121,282 @@ class YouTubeService:
             'description': channel['snippet']['description'],
             'subscriber_count': channel['statistics']['subscriberCount'],
             'view_count': channel['statistics']['viewCount'],
-            'video_count': channel['statistics']['videoCount']
+            'video_count': channel['statistics']['videoCount'],
+            'uploads_playlist_id': channel['contentDetails']['relatedPlaylists']['uploads']
         }
 
-    def get_video_transcript(self, video_id):
-        """Get video transcript using youtube_transcript_api, preferring Portuguese language"""
+    def get_video_transcript(self, video_id, raise_on_error=False):
+        """Get video transcript using youtube_transcript_api, preferring Portuguese language
+        
+        Videos without transcripts return has_transcript=False. Other errors
+        (network, throttling after all retries) are raised when raise_on_error
+        is set, so callers can retry the video later.
+        """
+        from youtube_transcript_api._errors import NoTranscriptAvailable, NoTranscriptFound, TranscriptsDisabled
+        
+        cached = self.transcript_cache.get(video_id, TRANSCRIPT_LANGUAGES)
+        metrics.increment('transcripts.cache_hits' if cached else 'transcripts.cache_misses')
+        if cached:
+            if cached['available']:
+                return self._build_transcript_data(cached['segments'], cached['language'])
+            log_item(logger, "Transcrição indisponível em cache: %s", cached['error'], video_id=video_id, stage='transcripts')
+            return {
+                'transcript': '',
+                'has_transcript': False
+            }
+            
         try:
-            # Primeiro tenta obter a transcrição em português
-            try:
-                transcript_list = YouTubeTranscriptApi.get_transcript(video_id, languages=['pt', 'pt-BR'])
-            except (NoTranscriptAvailable, TranscriptsDisabled):
-                # Se não encontrar em português, tenta qualquer idioma disponível
-                print(f"Transcrição em português não disponível para o vídeo {video_id}, tentando outros idiomas...")
-                transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
-            
-            if transcript_list:
-                # Combina todas as partes da transcrição em um texto
-                full_transcript = ' '.join([entry['text'] for entry in transcript_list])
-                return {
-                    'transcript': full_transcript,
-                    'has_transcript': True
-                }
+            segments, language = self._fetch_transcript(video_id)
+            self.transcript_cache.set(video_id, TRANSCRIPT_LANGUAGES, language, segments)
+            return self._build_transcript_data(segments, language)
                 
-        except (NoTranscriptAvailable, TranscriptsDisabled) as e:
-            print(f"❌ Transcrição não disponível para o vídeo {video_id}")
-            print(f"Detalhes do erro: {str(e)}")
+        except (NoTranscriptAvailable, NoTranscriptFound, TranscriptsDisabled) as e:
+            log_item(logger, "Transcrição não disponível: %s", type(e).__name__, video_id=video_id, stage='transcripts')
+            self.transcript_cache.set_unavailable(video_id, TRANSCRIPT_LANGUAGES, type(e).__name__)
             
         except Exception as e:
-            print(f"❌ Erro ao buscar transcrição para o vídeo {video_id}")
-            print(f"Detalhes do erro: {str(e)}")
-            print(f"Tipo do erro: {type(e).__name__}")
+            logger.error("Erro ao buscar transcrição (%s): %s", type(e).__name__, e,
+                         extra={'video_id': video_id, 'stage': 'transcripts'})
+            if raise_on_error:
+                raise
             
         return {
             'transcript': '',
             'has_transcript': False
         }
 
-    def get_recent_videos(self, channel_id):
-        """Get videos published in the last 7 days"""
-        seven_days_ago = (datetime.utcnow() - timedelta(days=7)).isoformat() + 'Z'
-        print(f"Buscando vídeos desde: {seven_days_ago}")
-        
-        request = self.youtube.search().list(
-            part="snippet",
-            channelId=channel_id,
-            maxResults=50,
-            order="date",
-            publishedAfter=seven_days_ago,
-            type="video"
+    def get_transcript_segments(self, video_id):
+        """Get the cached timed segments of a video transcript, or None if they are not cached"""
+        cached = self.transcript_cache.get(video_id, TRANSCRIPT_LANGUAGES)
+        if cached and cached['available']:
+            return cached['segments']
+        return None
+
+    def _fetch_transcript(self, video_id):
+        """Download the transcript segments and return them with the chosen language
+        
+        Calls are paced by the shared token bucket and retried with backoff
+        when YouTube throttles us.
+        """
+        from youtube_transcript_api import YouTubeTranscriptApi
+        from youtube_transcript_api._errors import NoTranscriptFound, TooManyRequests, YouTubeRequestFailed
+        
+        def fetch():
+            self.transcript_rate_limiter.acquire()
+            with limit('transcripts'):
+                transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+                try:
+                    # Primeiro tenta obter a transcrição em português
+                    transcript = transcript_list.find_transcript(TRANSCRIPT_LANGUAGES[:-1])
+                except NoTranscriptFound:
+                    # Se não encontrar em português, tenta em inglês
+                    log_item(logger, "Transcrição em português não disponível, tentando outros idiomas...",
+                             video_id=video_id, stage='transcripts')
+                    transcript = transcript_list.find_transcript(TRANSCRIPT_LANGUAGES[-1:])
+                return transcript.fetch(), transcript.language_code
+
+        with metrics.timer('transcripts.fetch'):
+            return retry_with_backoff(
+                fetch,
+                retry_on=(TooManyRequests, YouTubeRequestFailed),
+                max_retries=TRANSCRIPT_MAX_RETRIES,
+                base_delay=TRANSCRIPT_BACKOFF_BASE_SECONDS,
+                max_delay=TRANSCRIPT_BACKOFF_MAX_SECONDS
+            )
+
+    def _build_transcript_data(self, segments, language):
+        """Combine the transcript segments into the text stored on the video"""
+        if not segments:
+            return {
+                'transcript': '',
+                'has_transcript': False
+            }
+        return {
+            'transcript': ' '.join([entry['text'] for entry in segments]),
+            'has_transcript': True,
+            'transcript_language': language
+        }
+
+    @timed('youtube.get_recent_videos')
+    def get_recent_videos(self, channel_id, uploads_playlist_id=None, last_seen_video_id=None):
+        """Get videos published in the last 7 days
+        
+        Videos are discovered through the channel's uploads playlist (1 quota
+        unit per page) or, when no playlist is known, the public RSS feed.
+        Discovery stops at the first video older than the window or at
+        last_seen_video_id, so only videos not seen by a previous run are returned.
+        """
+        published_after = datetime.utcnow() - timedelta(days=RECENT_VIDEOS_DAYS)
+        logger.debug("Buscando vídeos desde: %sZ", published_after.isoformat(), extra={'channel_id': channel_id})
+        
+        video_ids = self.discover_recent_video_ids(
+            channel_id,
+            published_after,
+            uploads_playlist_id=uploads_playlist_id,
+            last_seen_video_id=last_seen_video_id
         )
+        logger.info("Encontrados %d vídeos novos", len(video_ids), extra={'channel_id': channel_id, 'stage': 'discovery'})
+        
+        # Get snippet, statistics and contentDetails for all videos at once
+        videos_details = self.get_videos_details(video_ids)
         
         videos = []
+        for video_id in video_ids:
+            if video_id not in videos_details:
+                continue
+                
+            video_data = {
+                'id': video_id,
+                'channel_id': channel_id,
+                **videos_details[video_id]
+            }
+            
+            # Get video transcript
+            log_item(logger, "Buscando transcrição para o vídeo: %s", video_data['title'], video_id=video_id, stage='transcripts')
+            transcript_data = self.get_video_transcript(video_data['id'])
+            video_data.update(transcript_data)
+            
+            videos.append(video_data)
+            
+        return videos
+
+    def discover_recent_video_ids(self, channel_id, published_after, uploads_playlist_id=None, last_seen_video_id=None):
+        """
+        Get the IDs of the channel's videos published after published_after, newest first.
+        Uses the uploads playlist when available and falls back to the RSS feed.
+        """
+        if uploads_playlist_id:
+            try:
+                return self._discover_from_uploads_playlist(uploads_playlist_id, published_after, last_seen_video_id)
+            except HttpError as e:
+                logger.warning("Erro ao ler playlist de uploads %s, usando feed RSS: %s", uploads_playlist_id, e,
+                               extra={'channel_id': channel_id, 'stage': 'discovery'})
+                
+        return self._discover_from_rss(channel_id, published_after, last_seen_video_id)
+
+    def _discover_from_uploads_playlist(self, uploads_playlist_id, published_after, last_seen_video_id=None):
+        """Page playlistItems.list until a video older than the window or already seen is found"""
+        request = self.youtube.playlistItems().list(
+            part="contentDetails",
+            playlistId=uploads_playlist_id,
+            maxResults=50
+        )
+        
+        video_ids = []
         while request:
-            response = request.execute()
-            print(f"Encontrados {len(response['items'])} vídeos nesta página")
+            response = self._execute(request)
             
             for item in response['items']:
-                video_data = {
-                    'id': item['id']['videoId'],
-                    'channel_id': channel_id,
-                    'title': item['snippet']['title'],
-                    'description': item['snippet']['description'],
-                    'published_at': item['snippet']['publishedAt'],
-                    'thumbnail_url': item['snippet']['thumbnails']['high']['url']
-                }
-                
-                # Get additional video statistics
-                print(f"Buscando estatísticas para o vídeo: {video_data['title']}")
-                video_stats = self.get_video_statistics(video_data['id'])
-                video_data.update(video_stats)
-                
-                # Get video transcript
-                print(f"Buscando transcrição para o vídeo: {video_data['title']}")
-                transcript_data = self.get_video_transcript(video_data['id'])
-                video_data.update(transcript_data)
+                video_id = item['contentDetails']['videoId']
+                published_at = item['contentDetails'].get('videoPublishedAt')
                 
-                videos.append(video_data)
+                if video_id == last_seen_video_id:
+                    return video_ids
+                # Private and deleted videos have no publish date
+                if not published_at:
+                    continue
+                if _parse_datetime(published_at) < published_after:
+                    return video_ids
+                    
+                video_ids.append(video_id)
             
-            request = self.youtube.search().list_next(request, response)
+            request = self.youtube.playlistItems().list_next(request, response)
             
-        return videos
+        return video_ids
 
-    def get_video_statistics(self, video_id):
-        """Get video statistics"""
-        request = self.youtube.videos().list(
-            part="statistics",
-            id=video_id
-        )
-        response = request.execute()
+    def get_latest_video_id(self, channel_id, uploads_playlist_id=None):
+        """
+        Get the ID of the channel's most recent upload, or None if it can't be found.
         
-        if not response['items']:
-            print(f"❌ Estatísticas não encontradas para o vídeo: {video_id}")
-            return {}
+        Used to detect channels with nothing new before any other work. Reads the
+        RSS feed, which costs no quota, and falls back to the first item of the
+        uploads playlist (1 quota unit).
+        """
+        try:
+            entries = self._rss_entries(channel_id)
+            return entries[0][0] if entries else None
+        except Exception as e:
+            logger.warning("Erro ao ler feed RSS: %s", e, extra={'channel_id': channel_id, 'stage': 'change_check'})
             
-        stats = response['items'][0]['statistics']
-        return {
-            'view_count': stats.get('viewCount', 0),
-            'like_count': stats.get('likeCount', 0),
-            'comment_count': stats.get('commentCount', 0)
-        }
+        if not uploads_playlist_id:
+            return None
+        try:
+            request = self.youtube.playlistItems().list(
+                part="contentDetails",
+                playlistId=uploads_playlist_id,
+                maxResults=1
+            )
+            items = self._execute(request)['items']
+            return items[0]['contentDetails']['videoId'] if items else None
+        except HttpError as e:
+            logger.warning("Erro ao ler playlist de uploads %s: %s", uploads_playlist_id, e,
+                           extra={'channel_id': channel_id, 'stage': 'change_check'})
+            return None
+
+    def _rss_entries(self, channel_id):
+        """Read the channel's public RSS feed: its 15 latest uploads as (video ID, published at), newest first"""
+        with metrics.timer('youtube.rss'):
+            response = requests.get(CHANNEL_RSS_URL, params={'channel_id': channel_id}, timeout=30)
+        response.raise_for_status()
+        feed = ElementTree.fromstring(response.content)
+        
+        return [
+            (entry.findtext('yt:videoId', namespaces=RSS_NAMESPACES),
+             entry.findtext('atom:published', namespaces=RSS_NAMESPACES))
+            for entry in feed.findall('atom:entry', RSS_NAMESPACES)
+        ]
+
+    def _discover_from_rss(self, channel_id, published_after, last_seen_video_id=None):
+        """Discover recent uploads from the RSS feed, which costs no quota"""
+        video_ids = []
+        for video_id, published_at in self._rss_entries(channel_id):
+            if video_id == last_seen_video_id:
+                break
+            if not published_at or _parse_datetime(published_at) < published_after:
+                break
+                
+            video_ids.append(video_id)
+            
+        return video_ids
+
+    def get_videos_details(self, video_ids):
+        """Get snippet, statistics and contentDetails for many videos
+        
+        videos.list accepts up to 50 comma-separated IDs per request, so the
+        lookup costs one request (and one quota unit) per 50 videos.
+        Returns a dict keyed by video ID.
+        """
+        details = {}
+        for start in range(0, len(video_ids), VIDEOS_LIST_MAX_IDS):
+            batch_ids = video_ids[start:start + VIDEOS_LIST_MAX_IDS]
+            logger.debug("Buscando detalhes de %d vídeos", len(batch_ids))
+            request = self.youtube.videos().list(
+                part="snippet,statistics,contentDetails",
+                id=','.join(batch_ids)
+            )
+            response = self._execute(request)
+            
+            for item in response['items']:
+                snippet = item['snippet']
+                stats = item.get('statistics', {})
+                thumbnails = snippet.get('thumbnails', {})
+                thumbnail = thumbnails.get('high') or thumbnails.get('default') or {}
+                details[item['id']] = {
+                    'title': snippet['title'],
+                    'description': snippet.get('description', ''),
+                    'published_at': snippet['publishedAt'],
+                    'thumbnail_url': thumbnail.get('url', ''),
+                    'view_count': stats.get('viewCount', 0),
+                    'like_count': stats.get('likeCount', 0),
+                    'comment_count': stats.get('commentCount', 0),
+                    'duration': item.get('contentDetails', {}).get('duration', '')
+                }
+        
+        missing = [video_id for video_id in video_ids if video_id not in details]
+        for video_id in missing:
+            logger.warning("Detalhes não encontrados para o vídeo", extra={'video_id': video_id})
+            
+        return details
 
     def extract_channel_id_from_url(self, url):
         """Extract channel ID from a YouTube channel URL
@@ -146,7 +409,7 @@ class YouTubeService:
         try:
             response = requests.get(url)
             if response.status_code != 200:
-                print(f"❌ Erro ao acessar URL: {url}")
+                logger.error("Erro ao acessar URL: %s", url)
                 return None
 
             # First try to find channel ID in URL
@@ -166,20 +429,32 @@ class YouTubeService:
             if channel_id_match:
                 return channel_id_match.group(1)
             
-            print(f"❌ Não foi possível encontrar o ID do canal na URL: {url}")
+            logger.error("Não foi possível encontrar o ID do canal na URL: %s", url)
             return None
 
         except Exception as e:
-            print(f"❌ Erro ao processar URL do canal: {str(e)}")
+            logger.error("Erro ao processar URL do canal: %s", e)
             return None 
 
-    def generate_video_summary(self, video_data):
-        """Generate summary for a single video if it has transcript"""
+    def generate_video_summary(self, video_data, previous_insight=None, cached_only=False):
+        """Generate summary for a single video if it has transcript
+        
+        previous_insight is the video's stored summary insight; it is reused
+        when nothing that determines the summary has changed. With cached_only
+        a new summary is never generated (used when summaries are batched).
+        """
         if video_data['has_transcript']:
-            print(f"Gerando resumo para o vídeo: {video_data['title']}")
+            log_item(logger, "Gerando resumo para o vídeo: %s", video_data['title'], video_id=video_data['id'], stage='video_summary')
+            # Long transcripts are chunked on the timed segments kept in the transcript cache
+            segments = None
+            if self.claude_service.needs_chunking(video_data['transcript']):
+                segments = self.get_transcript_segments(video_data['id'])
             summary_data = self.claude_service.summarize_transcript(
                 video_data['transcript'],
-                video_data['title']
+                video_data['title'],
+                previous_insight=previous_insight,
+                cached_only=cached_only,
+                segments=segments
             )
             return summary_data
         return {
@@ -187,10 +462,11 @@ class YouTubeService:
             'has_summary': False
         }
         
-    def generate_weekly_channel_summary(self, channel_title, videos):
+    def generate_weekly_channel_summary(self, channel_title, videos, previous_summary=None):
         """Generate weekly summary for a channel based on its videos"""
-        print(f"Gerando resumo semanal para o canal {channel_title}...")
+        logger.info("Gerando resumo semanal para o canal %s...", channel_title, extra={'stage': 'channel_summary'})
         return self.claude_service.create_weekly_channel_summary(
             channel_title,
-            videos
+            videos,
+            previous_summary=previous_summary
         ) 
\ No newline at end of file